@@ -1,17 +1,17 @@
 import io
 import json
-import os
 from datetime import date, datetime
 from typing import Optional
 
 from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import select, func, text
+from sqlalchemy import bindparam, select, func, text
 
 from backend.core.database import (
     engine,
     remote_items,
+    remote_defect_items,
     remote_trays,
     remote_tray_items,
     remote_scan_errors,
@@ -22,25 +22,38 @@ from backend.services.printing import generate_label, db_create_print_job, creat
 from backend.services.delivery_optimizer import (
     load_schools_from_json,
     fetch_trays_packed_times,
-    assign_trays_to_schools,
 )
 from backend.utils.auth import get_current_user, get_current_kitchen
 from backend.utils.permissions import require_permission
 from backend.utils.validators import new_item_id
-from backend.utils.datetime_helpers import now_local_iso
+from backend.utils.datetime_helpers import LOCAL_TZ, now_local_iso
+from backend.utils.schools_json import SCHOOLS_FILE, load_schools_json
 
 router = APIRouter()
 
 PAGE_SIZE = 50
 
-SCHOOLS_FILE = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
-    "data", "schools.json",
-)
 
 
 # ── Overview ─────────────────────────────────────────────────────────────────
 
+def _count_on_day(table, date_col, label):
+    return (
+        select(func.count()).select_from(table)
+        .where((date_col == bindparam("day")) & (table.c.kitchen_id == bindparam("kid")))
+        .scalar_subquery().label(label)
+    )
+
+
+# The four dashboard counters in one round-trip instead of four.
+_OVERVIEW_COUNTS = select(
+    _count_on_day(remote_items, remote_items.c.created_date_receiving, "received"),
+    _count_on_day(remote_items, remote_items.c.created_date_processing, "processed"),
+    _count_on_day(remote_trays, remote_trays.c.created_date_packing, "packed"),
+    _count_on_day(remote_trays, remote_trays.c.created_date_delivery, "delivered"),
+)
+
+
 @router.get("/overview")
 async def overview(
     date_filter: Optional[str] = Query(None, alias="date"),
@@ -49,39 +62,12 @@ async def overview(
     today = date.fromisoformat(date_filter) if date_filter else date.today()
     kid = kitchen["id"]
     with engine.connect() as c:
-        received = c.execute(
-            select(func.count()).select_from(remote_items)
-            .where(
-                (remote_items.c.created_date_receiving == today) &
-                (remote_items.c.kitchen_id == kid)
-            )
-        ).scalar() or 0
-        processed = c.execute(
-            select(func.count()).select_from(remote_items)
-            .where(
-                (remote_items.c.created_date_processing == today) &
-                (remote_items.c.kitchen_id == kid)
-            )
-        ).scalar() or 0
-        packed = c.execute(
-            select(func.count()).select_from(remote_trays)
-            .where(
-                (remote_trays.c.created_date_packing == today) &
-                (remote_trays.c.kitchen_id == kid)
-            )
-        ).scalar() or 0
-        delivered = c.execute(
-            select(func.count()).select_from(remote_trays)
-            .where(
-                (remote_trays.c.created_date_delivery == today) &
-                (remote_trays.c.kitchen_id == kid)
-            )
-        ).scalar() or 0
+        counts = c.execute(_OVERVIEW_COUNTS, {"day": today, "kid": kid}).one()
     return {
-        "items_received": received,
-        "items_processed": processed,
-        "trays_packed": packed,
-        "trays_delivered": delivered,
+        "items_received": counts.received or 0,
+        "items_processed": counts.processed or 0,
+        "trays_packed": counts.packed or 0,
+        "trays_delivered": counts.delivered or 0,
         "date": str(today),
         "kitchen": {"id": kitchen["id"], "slug": kitchen["slug"], "name": kitchen["name"]},
     }
@@ -99,7 +85,33 @@ async def get_items(
 ):
     offset = (page - 1) * PAGE_SIZE
     kid = kitchen["id"]
-    q = select(remote_items).where(remote_items.c.kitchen_id == kid).order_by(remote_items.c.created_at_receiving.desc())
+    # Only the columns the list renders; items also carries PO/inspection
+    # links and storage routing that this page never reads.
+    q = (
+        select(
+            remote_items.c.id,
+            remote_items.c.name,
+            remote_items.c.weight_grams,
+            remote_items.c.unit,
+            remote_items.c.reason,
+            remote_items.c.receiving,
+            remote_items.c.created_at_receiving,
+            remote_items.c.created_date_receiving,
+            remote_items.c.processing,
+            remote_items.c.created_at_processing,
+        )
+        .where(remote_items.c.kitchen_id == kid)
+        .order_by(remote_items.c.created_at_receiving.desc())
+    )
+    if include_availability:
+        # Per-row defect total in the same query (ix_defect_items_item_id),
+        # instead of a second round-trip merged back in Python.
+        q = q.add_columns(
+            select(func.coalesce(func.sum(remote_defect_items.c.weight_grams), 0))
+            .where(remote_defect_items.c.item_id == remote_items.c.id)
+            .scalar_subquery()
+            .label("already_defected")
+        )
     count_q = select(func.count()).select_from(remote_items).where(remote_items.c.kitchen_id == kid)
 
     if date_filter:
@@ -113,18 +125,6 @@ async def get_items(
         total = c.execute(count_q).scalar() or 0
         rows = c.execute(q.limit(PAGE_SIZE).offset(offset)).fetchall()
 
-    defect_map: dict = {}
-    if include_availability and rows:
-        ids = [r.id for r in rows]
-        with engine.connect() as c:
-            sums = c.execute(text("""
-                SELECT item_id, COALESCE(SUM(weight_grams), 0) AS total
-                FROM defect_items
-                WHERE item_id = ANY(:ids)
-                GROUP BY item_id
-            """), {"ids": ids}).fetchall()
-            defect_map = {r.item_id: int(r.total or 0) for r in sums}
-
     items = []
     for r in rows:
         row = {
@@ -140,7 +140,7 @@ async def get_items(
             "created_at_processing": str(r.created_at_processing) if r.created_at_processing else None,
         }
         if include_availability:
-            already = defect_map.get(r.id, 0)
+            already = int(r.already_defected or 0)
             row["already_defected_grams"] = already
             row["available_grams"] = max(0, int(r.weight_grams or 0) - already)
         items.append(row)
@@ -326,7 +326,19 @@ async def get_trays(
 ):
     offset = (page - 1) * PAGE_SIZE
     kid = kitchen["id"]
-    q = select(remote_trays).where(remote_trays.c.kitchen_id == kid).order_by(remote_trays.c.created_at_packing.desc().nullslast())
+    q = (
+        select(
+            remote_trays.c.id,
+            remote_trays.c.tray_id,
+            remote_trays.c.reason,
+            remote_trays.c.packing,
+            remote_trays.c.created_at_packing,
+            remote_trays.c.delivery,
+            remote_trays.c.created_at_delivery,
+        )
+        .where(remote_trays.c.kitchen_id == kid)
+        .order_by(remote_trays.c.created_at_packing.desc().nullslast())
+    )
     count_q = select(func.count()).select_from(remote_trays).where(remote_trays.c.kitchen_id == kid)
 
     if date_filter:
@@ -571,7 +583,12 @@ async def get_countdown(tray_id: str):
     """Public endpoint: since tray_id is not globally unique across kitchens,
     we resolve the most recently delivered tray with that id across all kitchens."""
     from datetime import timedelta
-    from backend.api.scans import _scan_allocations
+    from backend.api.scans import _scan_allocations, TRAY_LEN, TRAY_PREFIX
+
+    # Public and unauthenticated: reject anything that can't be a tray code
+    # before it costs a query.
+    if len(tray_id) != TRAY_LEN or not tray_id.upper().startswith(TRAY_PREFIX):
+        raise HTTPException(status_code=404, detail="Tray not found")
 
     with engine.connect() as c:
         row = c.execute(
@@ -594,15 +611,9 @@ async def get_countdown(tray_id: str):
     allocations = []
 
     if row.delivery and row.created_at_delivery:
-        from backend.core.config import TZ_REGION
-        try:
-            from zoneinfo import ZoneInfo
-            tz = ZoneInfo(TZ_REGION)
-        except Exception:
-            tz = None
         delivered_at_dt = row.created_at_delivery
-        if tz and delivered_at_dt.tzinfo is None:
-            delivered_at_dt = delivered_at_dt.replace(tzinfo=tz)
+        if delivered_at_dt.tzinfo is None:
+            delivered_at_dt = delivered_at_dt.replace(tzinfo=LOCAL_TZ)
         safe_until_dt = delivered_at_dt + timedelta(hours=SAFE_HOURS)
         delivered_at = delivered_at_dt.isoformat()
         safe_until = safe_until_dt.isoformat()
@@ -620,8 +631,7 @@ async def get_countdown(tray_id: str):
         except ValueError:
             n = len(scan_order)
 
-        with open(SCHOOLS_FILE, "r", encoding="utf-8") as f:
-            schools = json.load(f)
+        schools = load_schools_json()
         schools_sorted = sorted(schools, key=lambda s: s["distance"])
         allocations = _scan_allocations(n, schools_sorted)
 
@@ -1,9 +1,11 @@
 # backend/api/health.py
+import hmac
 import os
 import time
 from typing import Optional
 
 from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import Response
 from sqlalchemy import text
 
 from backend.core.database import remote_engine
@@ -11,21 +13,40 @@ from backend.core.database import remote_engine
 router = APIRouter()
 
 CLOUD_PRINT_KEY = os.getenv("CLOUD_PRINT_KEY", "")
+_CLOUD_PRINT_KEY_BYTES = CLOUD_PRINT_KEY.encode("utf-8")
+
+
+def print_key_matches(x_print_key: Optional[str]) -> bool:
+    """Constant-time check of a printer key against the legacy CLOUD_PRINT_KEY.
+    Always False when no legacy key is configured."""
+    if not _CLOUD_PRINT_KEY_BYTES:
+        return False
+    return hmac.compare_digest((x_print_key or "").encode("utf-8"), _CLOUD_PRINT_KEY_BYTES)
+
 
 def check_print_key(x_print_key: Optional[str]):
-    if CLOUD_PRINT_KEY and x_print_key != CLOUD_PRINT_KEY:
+    if CLOUD_PRINT_KEY and not print_key_matches(x_print_key):
         raise HTTPException(status_code=403, detail="Invalid print key")
 
+# Liveness probes are hit by the load balancer / uptime monitor many times a
+# minute; the body never changes, so skip the JSON encoder entirely.
+_OK_BODY = b'{"status":"ok"}'
+
+
+def _ok() -> Response:
+    return Response(content=_OK_BODY, media_type="application/json")
+
+
 @router.get("/kaithhealth")
 async def health_main():
-    return {"status": "ok"}
+    return _ok()
 
 @router.get("/kaithhealthcheck")
 @router.get("/kaithheathcheck")  # keep typo route
 @router.get("/health")
 @router.get("/healthz")
 async def health_variants():
-    return {"status": "ok"}
+    return _ok()
 
 
 @router.get("/health/deep")
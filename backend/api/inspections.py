@@ -47,6 +47,7 @@ from backend.core.database import (
     db_get_purchase_order,
     db_audit_log,
     db_notify_users_with_perm,
+    upsert_insert,
 )
 from backend.utils.auth import get_current_user
 from backend.utils.permissions import require_permission, has_permission
@@ -255,9 +256,27 @@ async def submit_signoff(
 # ── Per-line accept (container split + multi-label print) ───────────────────
 
 
-def _new_unique_item_id() -> str:
-    """Reuse the existing BHN-XXXXXXXX random format."""
-    return new_item_id()
+def _insert_new_items(c, rows: list[dict]) -> list[str]:
+    """Insert `rows` into items in one multi-row INSERT, each under a fresh
+    BHN-XXXXXXXX id, and return the ids in row order.
+
+    The primary key is the uniqueness check: ON CONFLICT DO NOTHING drops a
+    row whose id is taken, and only those rows go round again with new ids.
+    """
+    ids: list[Optional[str]] = [None] * len(rows)
+    pending = list(range(len(rows)))
+    while pending:
+        batch = {new_item_id(): i for i in pending}
+        inserted = c.execute(
+            upsert_insert(c, remote_items)
+            .values([{**rows[i], "id": item_id} for item_id, i in batch.items()])
+            .on_conflict_do_nothing(index_elements=["id"])
+            .returning(remote_items.c.id)
+        ).scalars()
+        for item_id in inserted:
+            ids[batch[item_id]] = item_id
+        pending = [i for i in pending if ids[i] is None]
+    return ids
 
 
 @router.post("/inspections/{inspection_id}/lines/{line_id}/accept")
@@ -298,7 +317,6 @@ async def accept_inspection_line(
         )
 
     actual_total = sum(c.weight_grams for c in body.containers)
-    item_ids: list[str] = []
     today = date.today()
 
     with engine.begin() as c:
@@ -314,25 +332,23 @@ async def accept_inspection_line(
                 notes=body.notes,
             )
         )
-        # Insert N items rows (one per container).
-        for cont in body.containers:
-            item_id = _new_unique_item_id()
-            item_ids.append(item_id)
-            c.execute(
-                remote_items.insert().values(
-                    id=item_id,
-                    kitchen_id=kitchen["id"],
-                    name=line["item_name"],
-                    weight_grams=cont.weight_grams,
-                    unit="g",
-                    receiving=True,
-                    created_at_receiving=datetime.now(),
-                    created_date_receiving=today,
-                    parent_po_line_id=line.get("po_line_id"),
-                    inspection_line_id=line_id,
-                    storage_routing=body.storage_routing,
-                )
-            )
+        # Insert N items rows (one per container) in a single round-trip.
+        received_at = datetime.now()
+        item_ids = _insert_new_items(c, [
+            {
+                "kitchen_id": kitchen["id"],
+                "name": line["item_name"],
+                "weight_grams": cont.weight_grams,
+                "unit": "g",
+                "receiving": True,
+                "created_at_receiving": received_at,
+                "created_date_receiving": today,
+                "parent_po_line_id": line.get("po_line_id"),
+                "inspection_line_id": line_id,
+                "storage_routing": body.storage_routing,
+            }
+            for cont in body.containers
+        ])
 
     # Multi-label print (one TSPL job per container) — same per-kitchen routing
     # used by the existing single-item flow.
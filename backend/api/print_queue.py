@@ -1,15 +1,23 @@
 # backend/api/print_queue.py
+import asyncio
 import logging
+import select
+import threading
 from typing import Dict, List, Optional
 
-from fastapi import APIRouter, Header, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Header, Query, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
-from backend.services.printing import db_get_next_print_job, db_mark_print_job_printed
+from backend.services.printing import (
+    PRINT_JOBS_CHANNEL,
+    db_claim_print_jobs,
+    db_mark_print_jobs_printed,
+)
 from backend.core.models import PrintCompletePayload
-from backend.api.health import CLOUD_PRINT_KEY as LEGACY_CLOUD_PRINT_KEY
-from backend.core.database import db_get_kitchen_by_print_key, db_get_kitchen
+from backend.api.health import print_key_matches as legacy_print_key_matches
+from backend.core.database import db_get_kitchen_by_print_key, db_get_kitchen, remote_engine
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -20,6 +28,63 @@ _printer_ws: Dict[int, WebSocket] = {}
 # Printers registered per kitchen (human-readable list for the admin UI).
 _registered_printers: Dict[int, List[str]] = {}
 
+# Set when a job is queued for a kitchen whose agent is offline, so long-polling
+# /print-queue callers wake up immediately instead of at their next poll.
+_job_queued: Dict[int, asyncio.Event] = {}
+
+
+def notify_job_queued(kitchen_id: Optional[int]) -> None:
+    if kitchen_id is None:
+        for ev in _job_queued.values():
+            ev.set()
+        return
+    ev = _job_queued.get(kitchen_id)
+    if ev is not None:
+        ev.set()
+
+
+# With several uvicorn workers, a job queued in one worker can't set the Event
+# a long-poll is parked on in another, so that poll would sit out its whole
+# `wait`. On Postgres every worker LISTENs for db_notify_print_job and relays
+# it onto its own loop. (A transaction-mode pooler drops LISTEN; polls then
+# just fall back to the re-read after `wait`.)
+
+def _listen_for_jobs(loop: asyncio.AbstractEventLoop, stop: threading.Event) -> None:
+    dialect = remote_engine.dialect
+    while not stop.is_set():
+        conn = None
+        try:
+            cargs, cparams = dialect.create_connect_args(remote_engine.url)
+            conn = dialect.connect(*cargs, **cparams)
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {PRINT_JOBS_CHANNEL}")
+            while not stop.is_set():
+                # Short timeout only so shutdown isn't held up.
+                if not select.select([conn], [], [], 5)[0]:
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    kid = conn.notifies.pop(0).payload
+                    loop.call_soon_threadsafe(notify_job_queued, int(kid) if kid else None)
+        except Exception as e:
+            logger.warning(f"[PRINT] Job listener: {e}; reconnecting in 5s")
+            stop.wait(5)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+
+def start_job_listener(loop: asyncio.AbstractEventLoop) -> Optional[threading.Event]:
+    """Start the LISTEN thread (psycopg2 only). Set the returned Event to stop it."""
+    if remote_engine is None or remote_engine.dialect.driver != "psycopg2":
+        return None
+    stop = threading.Event()
+    threading.Thread(target=_listen_for_jobs, args=(loop, stop), daemon=True).start()
+    return stop
+
 
 def _resolve_print_kitchen(key: Optional[str]) -> Optional[dict]:
     """Resolve a printer auth key to its kitchen."""
@@ -28,7 +93,7 @@ def _resolve_print_kitchen(key: Optional[str]) -> Optional[dict]:
     kitchen = db_get_kitchen_by_print_key(key)
     if kitchen:
         return kitchen
-    if LEGACY_CLOUD_PRINT_KEY and key == LEGACY_CLOUD_PRINT_KEY:
+    if legacy_print_key_matches(key):
         return db_get_kitchen(1)
     return None
 
@@ -87,7 +152,7 @@ async def printer_ws_endpoint(websocket: WebSocket):
             ok = data.get("ok", False)
             if job_id and ok:
                 try:
-                    db_mark_print_job_printed(job_id)
+                    db_mark_print_jobs_printed([job_id], kitchen_id=kid)
                     logger.info(f"[WS] Job {job_id} marked printed via WS ack (kitchen={kid})")
                 except Exception as e:
                     logger.error(f"[WS] Failed to mark job {job_id}: {e}")
@@ -131,16 +196,41 @@ async def printer_list(x_print_key: Optional[str] = Header(None, alias="X-Print-
 
 
 @router.get("/print-queue")
-async def print_queue(x_print_key: Optional[str] = Header(None, alias="X-Print-Key")):
-    """Polling fallback: returns the next job for the caller's kitchen only."""
+async def print_queue(
+    limit: int = Query(1, ge=1, le=50),
+    wait: float = Query(0, ge=0, le=25),
+    x_print_key: Optional[str] = Header(None, alias="X-Print-Key"),
+):
+    """Polling fallback: claims up to `limit` pending jobs (oldest first) for
+    the caller's kitchen only, so a backlog drains in one round-trip. Claimed
+    jobs are not handed to another poller until their lease runs out.
+
+    `limit` defaults to 1 because agents deployed before batching print only
+    jobs[0]; any further job claimed for them would sit out its lease and then
+    print out of order. Batching agents ask for more explicitly.
+
+    With `wait` > 0 this is a long-poll: an empty queue holds the request open
+    for up to `wait` seconds and returns as soon as a job is queued."""
     kitchen = _resolve_print_kitchen(x_print_key)
     if not kitchen:
         return JSONResponse({"detail": "Forbidden"}, status_code=403)
+    kid = kitchen["id"]
 
-    job = db_get_next_print_job(kitchen_id=kitchen["id"])
-    if not job:
+    event = _job_queued.setdefault(kid, asyncio.Event())
+    # Clear before reading so a job queued between the read and the wait
+    # still wakes us.
+    event.clear()
+    jobs = await run_in_threadpool(db_claim_print_jobs, kitchen_id=kid, limit=limit)
+    if not jobs and wait > 0:
+        try:
+            await asyncio.wait_for(event.wait(), timeout=wait)
+        except asyncio.TimeoutError:
+            pass
+        # Re-read even on timeout: another worker process may have queued it.
+        jobs = await run_in_threadpool(db_claim_print_jobs, kitchen_id=kid, limit=limit)
+    if not jobs:
         return {"jobs": []}
-    return {"jobs": [{"id": job["id"], "tspl": job["tspl"]}], "kitchen_id": kitchen["id"]}
+    return {"jobs": jobs, "kitchen_id": kid}
 
 
 @router.post("/print-complete")
@@ -151,8 +241,13 @@ async def print_complete(
     kitchen = _resolve_print_kitchen(x_print_key)
     if not kitchen:
         return JSONResponse({"detail": "Forbidden"}, status_code=403)
+    job_ids = list(payload.ids)
+    if payload.id is not None:
+        job_ids.append(payload.id)
+    if not job_ids:
+        return JSONResponse({"detail": "id or ids required"}, status_code=400)
     try:
-        db_mark_print_job_printed(payload.id)
-        return {"ok": True}
+        updated = db_mark_print_jobs_printed(job_ids, kitchen_id=kitchen["id"])
+        return {"ok": True, "updated": updated}
     except Exception as e:
         return JSONResponse({"detail": str(e)}, status_code=500)
@@ -1,11 +1,16 @@
+import hmac
 import os
-import json
+import re
+import threading
+import time
+from collections import OrderedDict
 from datetime import date, datetime
-from typing import Optional
+from typing import List, Optional
 
 from fastapi import APIRouter, Depends, Header, HTTPException
-from pydantic import BaseModel
-from sqlalchemy import select, text
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from sqlalchemy import bindparam, select, text
 
 from backend.core.database import (
     engine,
@@ -16,9 +21,11 @@ from backend.core.database import (
     db_get_kitchen_by_scanner_key,
     db_get_kitchen,
     db_list_schools,
+    upsert_insert,
 )
-from backend.services.printing import create_and_push_job
-from backend.utils.datetime_helpers import now_local_iso
+from backend.services.printing import create_and_push_job_later
+from backend.utils.datetime_helpers import now_local, now_local_iso
+from backend.utils.schools_json import load_schools_json
 from backend.api.sse import broadcast
 
 router = APIRouter()
@@ -27,10 +34,6 @@ BHN_PREFIX = "BHN-"
 TRAY_PREFIX = "TRY-"
 TRAY_LEN = 12
 
-SCHOOLS_FILE = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
-    "data", "schools.json",
-)
 COUNTDOWN_BASE_URL = (
     os.getenv("COUNTDOWN_BASE_URL") or
     os.getenv("API_BASE_URL", "http://localhost:8000")
@@ -38,6 +41,7 @@ COUNTDOWN_BASE_URL = (
 
 # Legacy single-tenant key; used as fallback if a kitchen hasn't been seeded yet.
 _LEGACY_SCANNER_KEY = os.getenv("SCANNER_KEY", "")
+_LEGACY_SCANNER_KEY_BYTES = _LEGACY_SCANNER_KEY.encode("utf-8")
 
 
 class ScanRequest(BaseModel):
@@ -45,6 +49,14 @@ class ScanRequest(BaseModel):
     step: str  # "Processing" | "Packing" | "Delivery"
 
 
+# Upper bound on one /scans/batch request (scanner offline-queue replay).
+MAX_SCAN_BATCH = 100
+
+
+class ScanBatchRequest(BaseModel):
+    scans: List[ScanRequest] = Field(..., max_length=MAX_SCAN_BATCH)
+
+
 def _resolve_scanner_kitchen(key: Optional[str]) -> dict:
     """Resolve a scanner key to its kitchen. Scanner devices have no JWT,
     so the request is authenticated (and tenant-routed) by the key alone."""
@@ -57,7 +69,7 @@ def _resolve_scanner_kitchen(key: Optional[str]) -> dict:
 
     # Transitional: before migration runs, the legacy global key still maps
     # all scans to kitchen id=1.
-    if _LEGACY_SCANNER_KEY and key == _LEGACY_SCANNER_KEY:
+    if _LEGACY_SCANNER_KEY_BYTES and hmac.compare_digest(key.encode("utf-8"), _LEGACY_SCANNER_KEY_BYTES):
         fallback = db_get_kitchen(1)
         if fallback:
             return fallback
@@ -67,6 +79,10 @@ def _resolve_scanner_kitchen(key: Optional[str]) -> dict:
 
 # ── Parsing ──────────────────────────────────────────────────────────────────
 
+# A code embedded in a URL or free text ends at whitespace or any of these.
+_CODE_END = re.compile(r"""[\s&?#/\\"',;()\[\]{}]""")
+
+
 def extract_code(raw: str) -> str:
     s = (raw or "").strip()
     if not s:
@@ -82,28 +98,89 @@ def extract_code(raw: str) -> str:
     for prefix in (TRAY_PREFIX, BHN_PREFIX):
         idx = s.find(prefix)
         if idx != -1:
-            chunk = s[idx:idx + 64].split()[0]
-            for delim in ["&", "?", "#", "/", "\\", '"', "'", ",", ";", ")", "(", "]", "[", "}", "{"]:
-                chunk = chunk.split(delim)[0]
-            return chunk
+            return _CODE_END.split(s[idx:idx + 64], 1)[0]
     return s
 
 
+# ── Tray registry cache ──────────────────────────────────────────────────────
+# tray_items is an append-only registry of physical trays, checked on every
+# Packing/Delivery scan. Positive lookups are cached for a few minutes so the
+# repeat scans of a day's trays skip that SELECT; misses always hit the DB so a
+# newly registered tray is accepted immediately.
+_REGISTERED_TTL = 300.0
+_REGISTERED_MAX = 20_000
+_registered_trays: "OrderedDict[tuple[int, str], float]" = OrderedDict()  # -> expiry (monotonic)
+_registered_lock = threading.Lock()
+
+
+def _tray_state_queries(*cols):
+    """(cached, uncached) SELECTs of `cols` for _tray_state, built once."""
+    cached = select(*cols).where(
+        (remote_trays.c.tray_id == bindparam("code")) &
+        (remote_trays.c.kitchen_id == bindparam("kid"))
+    )
+    uncached = (
+        select(remote_tray_items.c.tray_id.label("registered_tray_id"), *cols)
+        .select_from(
+            remote_tray_items.outerjoin(
+                remote_trays,
+                (remote_trays.c.tray_id == remote_tray_items.c.tray_id) &
+                (remote_trays.c.kitchen_id == remote_tray_items.c.kitchen_id),
+            )
+        )
+        .where(
+            (remote_tray_items.c.tray_id == bindparam("code")) &
+            (remote_tray_items.c.kitchen_id == bindparam("kid"))
+        )
+    )
+    return cached, uncached
+
+
+def _tray_state(c, code: str, kitchen_id: int, queries):
+    """Return (registered, trays row or None) in one round trip.
+
+    Uncached trays read tray_items LEFT JOIN trays in a single SELECT; a
+    cached registration only needs the trays columns.
+    """
+    key = (kitchen_id, code)
+    now = time.monotonic()
+    params = {"code": code, "kid": kitchen_id}
+    with _registered_lock:
+        expiry = _registered_trays.get(key)
+    if expiry is not None and expiry > now:
+        return True, c.execute(queries[0], params).first()
+
+    row = c.execute(queries[1], params).first()
+    if row is None:
+        return False, None
+    with _registered_lock:
+        _registered_trays[key] = now + _REGISTERED_TTL
+        _registered_trays.move_to_end(key)
+        while len(_registered_trays) > _REGISTERED_MAX:
+            _registered_trays.popitem(last=False)
+    return True, row
+
+
 # ── Validators (all scoped by kitchen_id) ────────────────────────────────────
+# Validators and appliers take the caller's connection so one scan is a single
+# transaction (and a single pooled checkout) instead of one per step. Their
+# statements are built once here with bind parameters rather than per scan.
 
-def validate_processing(code: str, kitchen_id: int) -> tuple[bool, str]:
+_ITEM_STATE = select(remote_items.c.receiving, remote_items.c.processing).where(
+    (remote_items.c.id == bindparam("code")) &
+    (remote_items.c.kitchen_id == bindparam("kid"))
+)
+_PACKING_STATE = _tray_state_queries(remote_trays.c.packing, remote_trays.c.created_date_packing)
+_DELIVERY_STATE = _tray_state_queries(
+    remote_trays.c.packing, remote_trays.c.delivery, remote_trays.c.created_date_delivery,
+)
+
+def validate_processing(c, code: str, kitchen_id: int) -> tuple[bool, str]:
     if not code:
         return False, "EMPTY_SCAN"
     if not code.upper().startswith(BHN_PREFIX):
         return False, f"NOT_AN_INGREDIENT_CODE (expected BHN-, got: {code[:8]})"
-    with engine.connect() as c:
-        row = c.execute(
-            select(remote_items.c.receiving, remote_items.c.processing)
-            .where(
-                (remote_items.c.id == code) &
-                (remote_items.c.kitchen_id == kitchen_id)
-            )
-        ).first()
+    row = c.execute(_ITEM_STATE, {"code": code, "kid": kitchen_id}).first()
     if row is None:
         return False, "INGREDIENT_NOT_FOUND"
     if not row.receiving:
@@ -113,28 +190,14 @@ def validate_processing(code: str, kitchen_id: int) -> tuple[bool, str]:
     return True, ""
 
 
-def validate_packing(code: str, kitchen_id: int) -> tuple[bool, str]:
+def validate_packing(c, code: str, kitchen_id: int) -> tuple[bool, str]:
     if not code:
         return False, "EMPTY_SCAN"
     if not code.upper().startswith(TRAY_PREFIX):
         return False, f"NOT_A_TRAY_CODE (expected TRY-, got: {code[:8]})"
     if len(code) != TRAY_LEN:
         return False, f"INVALID_TRAY_ID_LENGTH (expected {TRAY_LEN}, got {len(code)})"
-    with engine.connect() as c:
-        registered = c.execute(
-            select(remote_tray_items.c.tray_id)
-            .where(
-                (remote_tray_items.c.tray_id == code) &
-                (remote_tray_items.c.kitchen_id == kitchen_id)
-            )
-        ).first() is not None
-        row = c.execute(
-            select(remote_trays.c.packing, remote_trays.c.created_date_packing)
-            .where(
-                (remote_trays.c.tray_id == code) &
-                (remote_trays.c.kitchen_id == kitchen_id)
-            )
-        ).first()
+    registered, row = _tray_state(c, code, kitchen_id, _PACKING_STATE)
     if not registered:
         return False, "TRAY_NOT_REGISTERED"
     if row and row.packing and row.created_date_packing == date.today():
@@ -142,31 +205,14 @@ def validate_packing(code: str, kitchen_id: int) -> tuple[bool, str]:
     return True, ""
 
 
-def validate_delivery(code: str, kitchen_id: int) -> tuple[bool, str]:
+def validate_delivery(c, code: str, kitchen_id: int) -> tuple[bool, str]:
     if not code:
         return False, "EMPTY_SCAN"
     if not code.upper().startswith(TRAY_PREFIX):
         return False, f"NOT_A_TRAY_CODE (expected TRY-, got: {code[:8]})"
     if len(code) != TRAY_LEN:
         return False, f"INVALID_TRAY_ID_LENGTH (expected {TRAY_LEN}, got {len(code)})"
-    with engine.connect() as c:
-        registered = c.execute(
-            select(remote_tray_items.c.tray_id)
-            .where(
-                (remote_tray_items.c.tray_id == code) &
-                (remote_tray_items.c.kitchen_id == kitchen_id)
-            )
-        ).first() is not None
-        row = c.execute(
-            select(
-                remote_trays.c.packing,
-                remote_trays.c.delivery,
-                remote_trays.c.created_date_delivery,
-            ).where(
-                (remote_trays.c.tray_id == code) &
-                (remote_trays.c.kitchen_id == kitchen_id)
-            )
-        ).first()
+    registered, row = _tray_state(c, code, kitchen_id, _DELIVERY_STATE)
     if not registered:
         return False, "TRAY_NOT_REGISTERED"
     if not row or not row.packing:
@@ -177,89 +223,94 @@ def validate_delivery(code: str, kitchen_id: int) -> tuple[bool, str]:
 
 
 # ── Apply scan to DB (always scoped by kitchen) ─────────────────────────────
+# Each UPDATE repeats its validator's "already done" check in the WHERE, so a
+# concurrent duplicate scan matches no row (returns False) instead of
+# rewriting the row and overwriting the first timestamp.
+
+_APPLY_PROCESSING = (
+    remote_items.update()
+    .where(
+        (remote_items.c.id == bindparam("code")) &
+        (remote_items.c.kitchen_id == bindparam("kid")) &
+        (remote_items.c.processing.isnot(True))
+    )
+    .values(
+        processing=True,
+        created_at_processing=bindparam("now"),
+        created_date_processing=bindparam("today"),
+    )
+)
 
-def apply_processing(code: str, kitchen_id: int):
-    with engine.begin() as c:
-        c.execute(
-            remote_items.update()
-            .where(
-                (remote_items.c.id == code) &
-                (remote_items.c.kitchen_id == kitchen_id)
-            )
-            .values(
-                processing=True,
-                created_at_processing=datetime.now(),
-                created_date_processing=date.today(),
-            )
+_APPLY_DELIVERY = (
+    remote_trays.update()
+    .where(
+        (remote_trays.c.tray_id == bindparam("code")) &
+        (remote_trays.c.kitchen_id == bindparam("kid")) &
+        (
+            remote_trays.c.delivery.isnot(True) |
+            remote_trays.c.created_date_delivery.is_distinct_from(bindparam("today"))
         )
+    )
+    .values(
+        delivery=True,
+        created_at_delivery=bindparam("now"),
+        created_date_delivery=bindparam("today"),
+    )
+)
 
-
-def apply_packing(code: str, kitchen_id: int):
-    with engine.begin() as c:
-        existing = c.execute(
-            select(remote_trays.c.tray_id).where(
-                (remote_trays.c.tray_id == code) &
-                (remote_trays.c.kitchen_id == kitchen_id)
-            )
-        ).first()
-        if existing:
-            c.execute(
-                remote_trays.update()
-                .where(
-                    (remote_trays.c.tray_id == code) &
-                    (remote_trays.c.kitchen_id == kitchen_id)
-                )
-                .values(
-                    packing=True,
-                    created_at_packing=datetime.now(),
-                    created_date_packing=date.today(),
-                )
-            )
-        else:
-            c.execute(
-                remote_trays.insert().values(
-                    tray_id=code,
-                    kitchen_id=kitchen_id,
-                    packing=True,
-                    created_at_packing=datetime.now(),
-                    created_date_packing=date.today(),
-                )
-            )
+_INSERT_SCAN_ERROR = remote_scan_errors.insert()
+
+
+def apply_processing(c, code: str, kitchen_id: int) -> bool:
+    return c.execute(_APPLY_PROCESSING, {
+        "code": code, "kid": kitchen_id,
+        "now": datetime.now(), "today": date.today(),
+    }).rowcount > 0
+
+
+def apply_packing(c, code: str, kitchen_id: int) -> bool:
+    # Single upsert on uq_trays_tray_kitchen: no SELECT round trip, and two
+    # terminals packing the same tray can't race into an IntegrityError.
+    today = date.today()
+    stmt = upsert_insert(c, remote_trays).values(
+        tray_id=code,
+        kitchen_id=kitchen_id,
+        packing=True,
+        created_at_packing=datetime.now(),
+        created_date_packing=today,
+    )
+    return c.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["tray_id", "kitchen_id"],
+            set_={
+                "packing": stmt.excluded.packing,
+                "created_at_packing": stmt.excluded.created_at_packing,
+                "created_date_packing": stmt.excluded.created_date_packing,
+            },
+            where=(
+                remote_trays.c.packing.isnot(True) |
+                remote_trays.c.created_date_packing.is_distinct_from(today)
+            ),
+        )
+    ).rowcount > 0
 
 
-def apply_delivery(code: str, kitchen_id: int):
-    from backend.core.config import TZ_REGION
-    try:
-        from zoneinfo import ZoneInfo
-        now = datetime.now(tz=ZoneInfo(TZ_REGION))
-    except Exception:
-        now = datetime.now()
-    with engine.begin() as c:
-        c.execute(
-            remote_trays.update()
-            .where(
-                (remote_trays.c.tray_id == code) &
-                (remote_trays.c.kitchen_id == kitchen_id)
-            )
-            .values(
-                delivery=True,
-                created_at_delivery=now,
-                created_date_delivery=now.date(),
-            )
-        )
+def apply_delivery(c, code: str, kitchen_id: int) -> bool:
+    now = now_local()
+    return c.execute(_APPLY_DELIVERY, {
+        "code": code, "kid": kitchen_id,
+        "now": now, "today": now.date(),
+    }).rowcount > 0
 
 
-def log_scan_error(code: str, step: str, reason: str, kitchen_id: int):
-    with engine.begin() as c:
-        c.execute(
-            remote_scan_errors.insert().values(
-                kitchen_id=kitchen_id,
-                code=code,
-                step=step,
-                created_at=now_local_iso(),
-                reason=reason,
-            )
-        )
+def log_scan_error(c, code: str, step: str, reason: str, kitchen_id: int):
+    c.execute(_INSERT_SCAN_ERROR, {
+        "kitchen_id": kitchen_id,
+        "code": code,
+        "step": step,
+        "created_at": now_local_iso(),
+        "reason": reason,
+    })
 
 
 # ── Delivery allocation ─────────────────────────────────────────────────────
@@ -297,15 +348,41 @@ def _scan_allocations(n: int, schools_sorted: list) -> list:
     return allocations
 
 
-async def process_delivery_allocation(tray_id: str, kitchen: dict) -> dict:
-    kitchen_id = kitchen["id"]
+# ── Delivery schools cache ───────────────────────────────────────────────────
+# Every Delivery scan allocates against the kitchen's schools, which only
+# change through /admin/schools. Keep the distance-sorted list for a short
+# while; the admin endpoints drop it on write, and the TTL bounds staleness
+# across workers.
+_SCHOOLS_TTL = 30.0
+_delivery_schools: dict[int, tuple[float, list]] = {}  # kitchen_id -> (expiry, schools)
+_delivery_schools_lock = threading.Lock()
+
+
+def _schools_for_delivery(kitchen_id: int) -> list:
+    now = time.monotonic()
+    with _delivery_schools_lock:
+        hit = _delivery_schools.get(kitchen_id)
+    if hit and hit[0] > now:
+        return hit[1]
     # Phase 1: schools come from DB (kitchen-scoped). Fallback to JSON only if
     # the DB has no rows for this kitchen (e.g. fresh tenant with no master data).
     schools = db_list_schools(kitchen_id, active_only=True)
-    if not schools and os.path.isfile(SCHOOLS_FILE):
-        with open(SCHOOLS_FILE, "r", encoding="utf-8") as f:
-            schools = json.load(f)
+    if not schools:
+        schools = load_schools_json()
     schools_sorted = sorted(schools, key=lambda s: s["distance"])
+    with _delivery_schools_lock:
+        _delivery_schools[kitchen_id] = (now + _SCHOOLS_TTL, schools_sorted)
+    return schools_sorted
+
+
+def invalidate_delivery_schools(kitchen_id: int) -> None:
+    with _delivery_schools_lock:
+        _delivery_schools.pop(kitchen_id, None)
+
+
+def _delivery_allocations(tray_id: str, kitchen_id: int) -> list:
+    """Allocations for `tray_id` by its position in today's Delivery scans."""
+    schools_sorted = _schools_for_delivery(kitchen_id)
 
     with engine.connect() as c:
         rows = c.execute(text("""
@@ -320,7 +397,12 @@ async def process_delivery_allocation(tray_id: str, kitchen: dict) -> dict:
     except ValueError:
         n = len(scan_order)
 
-    allocations = _scan_allocations(n, schools_sorted)
+    return _scan_allocations(n, schools_sorted)
+
+
+async def process_delivery_allocation(tray_id: str, kitchen: dict) -> dict:
+    kitchen_id = kitchen["id"]
+    allocations = await run_in_threadpool(_delivery_allocations, tray_id, kitchen_id)
 
     qr_link = f"{COUNTDOWN_BASE_URL}/countdown/{tray_id}"
     y = 15
@@ -339,7 +421,8 @@ CLS
 QRCODE 300,5,L,3,A,0,"{qr_link}"
 PRINT 1,1
 """
-    await create_and_push_job(tspl, kitchen_id=kitchen_id, printer_name=kitchen.get("printer_name"))
+    # The scanner only needs the allocations back; the label prints behind it.
+    create_and_push_job_later(tspl, kitchen_id=kitchen_id, printer_name=kitchen.get("printer_name"))
     return {"tray_id": tray_id, "allocations": allocations}
 
 
@@ -357,6 +440,38 @@ APPLIERS = {
     "Delivery":   apply_delivery,
 }
 
+# Reason when the applier's guarded write matched nothing (lost a race).
+ALREADY_APPLIED = {
+    "Processing": "ALREADY_PROCESSED",
+    "Packing":    "ALREADY_PACKED_TODAY",
+    "Delivery":   "ALREADY_DELIVERED_TODAY",
+}
+
+
+def _apply_scan(c, step: str, code: str, raw_code: str, kitchen_id: int) -> tuple[bool, str]:
+    """Validate + apply (or log the rejection) on the caller's transaction."""
+    ok, reason = VALIDATORS[step](c, code, kitchen_id)
+    if ok and not APPLIERS[step](c, code, kitchen_id):
+        ok, reason = False, ALREADY_APPLIED[step]
+    if not ok:
+        log_scan_error(c, code or raw_code, step, reason, kitchen_id)
+    return ok, reason
+
+
+def _run_scan(step: str, code: str, raw_code: str, kitchen_id: int) -> tuple[bool, str]:
+    with engine.begin() as c:
+        return _apply_scan(c, step, code, raw_code, kitchen_id)
+
+
+def _run_scans(scans: List[tuple[str, str, str]], kitchen_id: int) -> List[tuple[bool, str]]:
+    """Apply (step, code, raw_code) scans in order under a single commit.
+
+    Later scans see earlier ones (e.g. Packing then Delivery of one tray). If
+    anything raises, the whole batch rolls back and the scanner retries it.
+    """
+    with engine.begin() as c:
+        return [_apply_scan(c, step, code, raw_code, kitchen_id) for step, code, raw_code in scans]
+
 
 @router.post("/scans")
 async def post_scan(
@@ -377,18 +492,20 @@ async def post_scan(
         token = authorization.split(" ", 1)[1].strip()
         try:
             from backend.utils.auth import decode_access_token
-            from backend.core.database import db_get_kitchen
             from backend.utils.permissions import has_permission
             payload = decode_access_token(token)
             kid = payload.get("active_kitchen_id")
             uid = payload.get("id")
             if kid:
-                k = db_get_kitchen(int(kid))
+                k = await run_in_threadpool(db_get_kitchen, int(kid))
                 if k:
                     # Permission gate for tablet-driven Processing.
                     if body.step == "Processing":
                         user_dict = {"id": int(uid) if uid else 0, "role": payload.get("role"), "org_id": payload.get("org_id")}
-                        if not has_permission(user_dict, "production.processing_scan", kitchen_id=k["id"]):
+                        allowed = await run_in_threadpool(
+                            has_permission, user_dict, "production.processing_scan", kitchen_id=k["id"],
+                        )
+                        if not allowed:
                             raise HTTPException(status_code=403, detail="Missing permission: production.processing_scan")
                     kitchen = k
         except HTTPException:
@@ -397,25 +514,61 @@ async def post_scan(
             kitchen = None
 
     if kitchen is None:
-        kitchen = _resolve_scanner_kitchen(x_scanner_key)
-    kitchen_id = kitchen["id"]
+        kitchen = await run_in_threadpool(_resolve_scanner_kitchen, x_scanner_key)
 
     if body.step not in VALIDATORS:
         raise HTTPException(400, f"Invalid step: {body.step}. Must be Processing, Packing, or Delivery.")
 
-    code = extract_code(body.code)
-    ok, reason = VALIDATORS[body.step](code, kitchen_id)
+    return await _process_scan(body.step, body.code, kitchen)
 
-    if not ok:
-        log_scan_error(code or body.code, body.step, reason, kitchen_id)
-        await broadcast("scan_error", {"code": code, "step": body.step, "reason": reason, "kitchen_id": kitchen_id})
-        return {"ok": False, "code": code, "step": body.step, "reason": reason, "data": None, "kitchen_id": kitchen_id}
 
-    APPLIERS[body.step](code, kitchen_id)
+@router.post("/scans/batch")
+async def post_scan_batch(
+    body: ScanBatchRequest,
+    x_scanner_key: Optional[str] = Header(None, alias="X-Scanner-Key"),
+):
+    """Replay a scanner's offline queue in one request.
+
+    Scans are applied in order exactly as POST /scans would (SSE broadcast,
+    Delivery allocation label), but share one transaction, so a page of
+    queued scans costs one commit. One result per scan is returned in the
+    same order. Scanner-key auth only.
+    """
+    kitchen = await run_in_threadpool(_resolve_scanner_kitchen, x_scanner_key)
+    kitchen_id = kitchen["id"]
+    codes = [extract_code(scan.code) for scan in body.scans]
+    valid = [(scan.step, code, scan.code)
+             for scan, code in zip(body.scans, codes) if scan.step in VALIDATORS]
+    outcomes = iter(await run_in_threadpool(_run_scans, valid, kitchen_id) if valid else ())
+    results = []
+    for scan, code in zip(body.scans, codes):
+        if scan.step not in VALIDATORS:
+            results.append({"ok": False, "code": scan.code, "step": scan.step, "reason": "INVALID_STEP",
+                            "data": None, "kitchen_id": kitchen_id})
+            continue
+        ok, reason = next(outcomes)
+        results.append(await _scan_result(scan.step, code, ok, reason, kitchen))
+    return {"results": results}
+
+
+async def _process_scan(step: str, raw_code: str, kitchen: dict) -> dict:
+    code = extract_code(raw_code)
+    # The DB driver is blocking; run it in the threadpool so a slow round-trip
+    # doesn't stall SSE streams and printer sockets on the event loop.
+    ok, reason = await run_in_threadpool(_run_scan, step, code, raw_code, kitchen["id"])
+    return await _scan_result(step, code, ok, reason, kitchen)
+
+
+async def _scan_result(step: str, code: str, ok: bool, reason: str, kitchen: dict) -> dict:
+    """Post-commit side effects (SSE, Delivery allocation) and the response."""
+    kitchen_id = kitchen["id"]
+    if not ok:
+        await broadcast("scan_error", {"code": code, "step": step, "reason": reason, "kitchen_id": kitchen_id})
+        return {"ok": False, "code": code, "step": step, "reason": reason, "data": None, "kitchen_id": kitchen_id}
 
     data = None
-    if body.step == "Delivery":
+    if step == "Delivery":
         data = await process_delivery_allocation(code, kitchen)
 
-    await broadcast("scan_ok", {"code": code, "step": body.step, "kitchen_id": kitchen_id})
-    return {"ok": True, "code": code, "step": body.step, "reason": "", "data": data, "kitchen_id": kitchen_id}
+    await broadcast("scan_ok", {"code": code, "step": step, "kitchen_id": kitchen_id})
+    return {"ok": True, "code": code, "step": step, "reason": "", "data": data, "kitchen_id": kitchen_id}
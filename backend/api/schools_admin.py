@@ -21,6 +21,7 @@ from backend.core.database import (
     db_get_school,
     db_audit_log,
 )
+from backend.api.scans import invalidate_delivery_schools
 from backend.utils.auth import get_current_user
 from backend.utils.permissions import require_permission
 
@@ -95,6 +96,7 @@ async def create_school(
             .returning(remote_schools.c.id)
         )
         new_id = res.scalar()
+    invalidate_delivery_schools(kitchen["id"])
 
     school = db_get_school(new_id, kitchen["id"])
     db_audit_log(
@@ -137,6 +139,7 @@ async def patch_school(
         )
         if res.rowcount == 0:
             raise HTTPException(404, "School not found")
+    invalidate_delivery_schools(kitchen["id"])
 
     after = db_get_school(school_id, kitchen["id"])
     db_audit_log(
@@ -172,6 +175,7 @@ async def delete_school(
             )
             .values(is_active=False)
         )
+    invalidate_delivery_schools(kitchen["id"])
 
     after = db_get_school(school_id, kitchen["id"])
     db_audit_log(
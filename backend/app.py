@@ -1,4 +1,7 @@
 # backend/app.py
+import asyncio
+import gzip
+import hashlib
 import os
 import logging
 import logging.handlers
@@ -20,10 +23,30 @@ if not any(isinstance(h, logging.handlers.RotatingFileHandler) for h in _root.ha
     _root.addHandler(_file_h)
     _root.setLevel(_log_level)
 
+
+# Uptime pings and the printer agents' /print-queue polls arrive every few
+# seconds around the clock; keep them out of the uvicorn access log.
+_QUIET_ACCESS_PATHS = frozenset({
+    "/health", "/healthz", "/kaithhealth", "/kaithhealthcheck", "/kaithheathcheck",
+    "/print-queue",
+})
+
+
+class _QuietAccessFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        # uvicorn.access args: (client_addr, method, full_path, http_version, status_code)
+        args = record.args
+        if isinstance(args, tuple) and len(args) >= 3:
+            return str(args[2]).split("?", 1)[0] not in _QUIET_ACCESS_PATHS
+        return True
+
+
+logging.getLogger("uvicorn.access").addFilter(_QuietAccessFilter())
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
@@ -57,11 +80,12 @@ logger = logging.getLogger(__name__)
 
 # ── Scheduler (module-level so it isn't GC'd) ────────────────────────────────
 _scheduler = None
+_job_listener = None
 
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI):
-    global _scheduler
+    global _scheduler, _job_listener
     # Create DB tables that may not exist yet (food_prices etc.)
     try:
         init_remote_db()
@@ -76,9 +100,23 @@ async def lifespan(_app: FastAPI):
     except Exception as e:
         logger.warning("Scheduler startup failed: %s", e)
 
+    # Wake /print-queue long-polls for jobs queued by other workers
+    try:
+        from backend.api.print_queue import start_job_listener
+        _job_listener = start_job_listener(asyncio.get_running_loop())
+    except Exception as e:
+        logger.warning("Print job listener startup failed: %s", e)
+
     yield
 
     # Shutdown
+    if _job_listener is not None:
+        _job_listener.set()
+    try:
+        from backend.services.printing import drain_print_queue
+        await drain_print_queue()
+    except Exception as e:
+        logger.warning("Draining background prints failed: %s", e)
     try:
         from backend.services.price_scheduler import stop_scheduler
         stop_scheduler(_scheduler)
@@ -95,7 +133,6 @@ app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
 # Security headers — sent on every response
 from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request as _StarletteRequest
 
 class _SecurityHeadersMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request, call_next):
@@ -203,6 +240,24 @@ async def scrape_is_running(_user: dict = Depends(get_current_user)):
 _SPA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend", "dist")
 _SPA_INDEX = os.path.join(_SPA_DIR, "index.html")
 
+# index.html is tiny and only changes on deploy — read it once per process so
+# every client-side route is a memory write instead of a stat + open + read.
+# The gzip body and ETag are computed once too, so reloads from the same device
+# revalidate to a bodyless 304.
+_SPA_INDEX_HTML: bytes | None = None
+_SPA_INDEX_GZ: bytes | None = None
+_SPA_INDEX_ETAG: str | None = None
+if os.path.isfile(_SPA_INDEX):
+    with open(_SPA_INDEX, "rb") as _f:
+        _SPA_INDEX_HTML = _f.read()
+    _SPA_INDEX_GZ = gzip.compress(_SPA_INDEX_HTML, 9)
+    _SPA_INDEX_ETAG = '"' + hashlib.sha1(_SPA_INDEX_HTML).hexdigest() + '"'
+
+# index.html references hashed /assets bundles, so it must be revalidated on
+# every load (no-cache) rather than cached for a fixed time — otherwise a
+# deploy would keep serving the old bundle names.
+_SPA_INDEX_HEADERS = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
 if os.path.isdir(os.path.join(_SPA_DIR, "assets")):
     app.mount("/assets", StaticFiles(directory=os.path.join(_SPA_DIR, "assets")), name="spa-assets")
 
@@ -218,14 +273,23 @@ if os.path.isfile(os.path.join(_SPA_DIR, "SUCCESS.mp3")):
 
 # SPA fallback: serve index.html for all non-API routes
 @app.get("/{full_path:path}")
-async def serve_spa(full_path: str):
+async def serve_spa(full_path: str, request: _FastAPIRequest):
+    if _SPA_INDEX_HTML is not None:
+        headers = {**_SPA_INDEX_HEADERS, "ETag": _SPA_INDEX_ETAG}
+        if request.headers.get("if-none-match") == _SPA_INDEX_ETAG:
+            return Response(status_code=304, headers=headers)
+        if "gzip" in request.headers.get("accept-encoding", "").lower():
+            headers["Content-Encoding"] = "gzip"
+            return Response(content=_SPA_INDEX_GZ, media_type="text/html", headers=headers)
+        return Response(content=_SPA_INDEX_HTML, media_type="text/html", headers=headers)
     if os.path.isfile(_SPA_INDEX):
         return FileResponse(_SPA_INDEX)
     return {"detail": "Frontend not built. Run: cd frontend && npm run build"}
 
 if __name__ == "__main__":
     import uvicorn
-    print(f"[INFO] DB={REMOTE_DB_URL}")
+    # Never log REMOTE_DB_URL itself — it carries the database password.
+    logger.info("DB=%s", "remote" if REMOTE_DB_URL else "local SQLite")
     uvicorn.run(
         "backend.app:app",
         host="0.0.0.0",
@@ -1,5 +1,6 @@
 # DPMBG_Project/backend/core/config.py
 
+import logging
 import os
 from dotenv import load_dotenv
 
@@ -41,4 +42,4 @@ DIV_CANON = {
     "sekolah": "school_receipt",
 }
 
-print("[CONFIG] Loaded successfully.")
+logging.getLogger(__name__).debug("Config loaded (TZ_REGION=%s)", TZ_REGION)
@@ -1,15 +1,14 @@
 # DPMBG_Project/backend/core/database.py
 import os
-from datetime import date, datetime
+from datetime import datetime
 from typing import Optional
 
-from backend.utils.datetime_helpers import now_local_iso
-
 from sqlalchemy import (
     create_engine, MetaData, Table, Column, Integer, String, Text,
     DateTime, Date, Boolean, Index, ForeignKey, UniqueConstraint,
-    select, func, insert, update, NullPool
+    select, func, insert, update, event
 )
+from sqlalchemy.engine import make_url
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -20,51 +19,57 @@ BASE_DIR      = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 LOCAL_DB_URL  = f"sqlite:///{os.path.join(BASE_DIR, 'local_scans.db')}"
 REMOTE_DB_URL = os.getenv("DATABASE_URL")
 
+# No pool_pre_ping: a local SQLite file can't drop a connection, so the
+# SELECT 1 before every checkout was pure overhead.
 local_engine = create_engine(
     LOCAL_DB_URL,
     future=True,
-    pool_pre_ping=True,
     connect_args={"check_same_thread": False},
 )
 
+
+@event.listens_for(local_engine, "connect")
+def _sqlite_pragmas(dbapi_conn, _record):
+    # WAL: readers don't block the writer and commits append to the log
+    # instead of rewriting the rollback journal; NORMAL only fsyncs at
+    # checkpoints, which is still crash-safe in WAL mode.
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA busy_timeout=5000")
+    cur.close()
+
+
 remote_engine = None
 if REMOTE_DB_URL:
+    _remote_kwargs = {}
+    if make_url(REMOTE_DB_URL).get_driver_name() == "psycopg2":
+        # executemany UPDATE/DELETE go out via psycopg2's execute_batch (pages
+        # of statements per round trip) instead of one round trip per row;
+        # INSERTs already use multi-row VALUES.
+        _remote_kwargs["executemany_mode"] = "values_plus_batch"
+
+    # Small persistent pool so requests don't each pay a fresh TCP+TLS+auth
+    # handshake to the Supabase pooler. Keep it small — the pooler caps client
+    # connections per project. pre_ping/recycle drop connections it has closed.
+    # LIFO hands out the most recently used connection, so connections opened
+    # for a burst sit idle at the bottom (where the pooler may time them out;
+    # pre_ping catches that) instead of being rotated and kept alive.
     remote_engine = create_engine(
-        REMOTE_DB_URL, 
-        future=True, 
+        REMOTE_DB_URL,
+        future=True,
         pool_pre_ping=True,
         pool_recycle=180,
-        poolclass=NullPool
+        pool_use_lifo=True,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "3")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "5")),
+        pool_timeout=10,
+        **_remote_kwargs,
         )
 
 # engine = remote if available, else local
 engine = remote_engine if remote_engine else local_engine
 
-# ============================================================
-# LOCAL TABLES (SQLite on Android/Windows scanner)
-# ============================================================
-local_metadata = MetaData()
-
-local_scan_queue = Table(
-    "local_scan_queue", local_metadata,
-    Column("id",         Integer, primary_key=True, autoincrement=True),
-    Column("code",       Text, nullable=False),
-    Column("step",       Text, nullable=False),    # "Processing" / "Packing" / "Delivery"
-    Column("label",      Text, nullable=False),    # "processed" / "packed" / "delivered"
-    Column("created_at", Text, nullable=False),
-    Column("synced",     Integer, default=0),
-)
-
-local_scan_errors = Table(
-    "local_scan_errors", local_metadata,
-    Column("id",         Integer, primary_key=True, autoincrement=True),
-    Column("code",       Text),
-    Column("step",       Text, nullable=False),
-    Column("created_at", Text, nullable=False),
-    Column("reason",     Text, nullable=False),
-    Column("synced",     Integer, default=0),
-)
-
 # ============================================================
 # REMOTE TABLE REFERENCES (PostgreSQL)
 # ============================================================
@@ -139,6 +144,8 @@ remote_trays = Table(
     Column("created_date_delivery", Date),
     UniqueConstraint("tray_id", "kitchen_id", name="uq_trays_tray_kitchen"),
 )
+# Per-day packing reads (delivery optimizer, dashboard pack→deliver time).
+Index("ix_trays_packing_date", remote_trays.c.created_date_packing, remote_trays.c.kitchen_id)
 
 # --- Tray registry (used for Packing validation)
 remote_tray_items = Table(
@@ -169,7 +176,18 @@ remote_print_jobs = Table(
     Column("created_at", DateTime, server_default=func.now()),
     Column("printed",    Integer, server_default=func.cast(0, Integer)),
     Column("printed_at", DateTime, nullable=True),
+    # Set when a poller claims the job; cleared only by the printed ack, so an
+    # unacked claim simply expires (see db_claim_print_jobs).
+    Column("claimed_at", DateTime, nullable=True),
 )
+# Pollers only ever look at the unprinted tail of print_jobs.
+Index("ix_print_jobs_pending", remote_print_jobs.c.kitchen_id, remote_print_jobs.c.id,
+      postgresql_where=remote_print_jobs.c.printed == 0,
+      sqlite_where=remote_print_jobs.c.printed == 0)
+# Range scan for the retention purge (printed = 1 AND printed_at < cutoff).
+Index("ix_print_jobs_printed_at", remote_print_jobs.c.printed_at,
+      postgresql_where=remote_print_jobs.c.printed == 1,
+      sqlite_where=remote_print_jobs.c.printed == 1)
 
 # --- Users (JWT auth)
 # Role hierarchy:
@@ -767,11 +785,6 @@ Index("ix_defect_items_kitchen_date", remote_defect_items.c.kitchen_id, remote_d
 # INIT
 # ============================================================
 
-def init_db():
-    """Create local SQLite tables. Call once on scanner startup."""
-    local_metadata.create_all(local_engine)
-
-
 def init_remote_db():
     """Create remote PostgreSQL tables (food_prices etc). Safe to call on startup."""
     if remote_engine:
@@ -1236,9 +1249,13 @@ def _online_migrate():
             enabled BOOLEAN DEFAULT TRUE,
             CONSTRAINT uq_notif_pref_user_category UNIQUE (user_id, category)
         )""",
+        "ALTER TABLE print_jobs ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP",
+        "CREATE INDEX IF NOT EXISTS ix_print_jobs_pending ON print_jobs (kitchen_id, id) WHERE printed = 0",
+        "CREATE INDEX IF NOT EXISTS ix_print_jobs_printed_at ON print_jobs (printed_at) WHERE printed = 1",
+        "CREATE INDEX IF NOT EXISTS ix_trays_packing_date ON trays (created_date_packing, kitchen_id)",
     ]
     # Each ALTER/CREATE runs inside its own SAVEPOINT on a SHARED connection.
-    # Per-statement transactions kept opening fresh pooler connections (NullPool),
+    # Per-statement transactions kept opening fresh pooler connections,
     # which Supabase rate-limits → "server closed connection unexpectedly". Using
     # a single connection + nested transactions (SAVEPOINT) preserves error
     # isolation (rollback to savepoint on failure) without exhausting the pool.
@@ -2389,7 +2406,6 @@ def db_get_nutrition_daily(kitchen_id: int, date_str: str) -> dict:
     5. Distribute evenly across schools by student_count.
     6. Compare against AKG preset for SD (7-9 tahun) as default.
     """
-    import json as _json
     from datetime import date as _date
     from sqlalchemy import text as _text
     import os
@@ -2453,14 +2469,8 @@ def db_get_nutrition_daily(kitchen_id: int, date_str: str) -> dict:
     per_tray = {k: total_nutr[k] / trays_delivered for k in total_nutr} if trays_delivered else {k: 0.0 for k in total_nutr}
 
     # Load schools
-    _SCHOOLS_FILE = os.path.join(
-        os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
-        "data", "schools.json",
-    )
-    schools_raw = []
-    if os.path.isfile(_SCHOOLS_FILE):
-        with open(_SCHOOLS_FILE, "r", encoding="utf-8") as f:
-            schools_raw = _json.load(f)
+    from backend.utils.schools_json import load_schools_json
+    schools_raw = load_schools_json()
 
     # AKG full-day targets per age group (Permenkes 28/2019)
     AKG_FULL_DAY_BY_GROUP = {
@@ -2556,49 +2566,20 @@ def db_get_price_history(kitchen_id: int, food_code: str, limit: int = 50) -> li
 # HELPERS
 # ============================================================
 
-def _iso_now() -> str:
-    return now_local_iso()
-
-# ---------- Local scan queue ----------
+def upsert_insert(conn, table):
+    """INSERT construct with ON CONFLICT support for the connection's dialect.
 
-def local_enqueue_scan(code: str, step: str, label: str) -> None:
-    with local_engine.begin() as c:
-        c.execute(local_scan_queue.insert().values(
-            code=code,
-            step=step,
-            label=label,
-            created_at=_iso_now(),
-            synced=0,
-        ))
-
-def local_enqueue_error(code: str, step: str, reason: str) -> None:
-    with local_engine.begin() as c:
-        c.execute(local_scan_errors.insert().values(
-            code=code,
-            step=step,
-            created_at=_iso_now(),
-            reason=reason,
-            synced=0,
-        ))
+    `engine` is Postgres in production but SQLite in local mode; both support
+    `on_conflict_do_nothing` / `on_conflict_do_update` via their own insert().
+    """
+    if conn.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    return dialect_insert(table)
 
 # ---------- Remote helpers ----------
 
-def db_insert_item(item_id: str, name: str, weight_g: int, unit: str = "g",
-                   reason: Optional[str] = None, kitchen_id: Optional[int] = None) -> None:
-    """Insert a new ingredient with receiving=True."""
-    with engine.begin() as c:
-        c.execute(remote_items.insert().values(
-            id=item_id,
-            kitchen_id=kitchen_id,
-            name=name,
-            weight_grams=weight_g,
-            unit=unit,
-            reason=reason,
-            receiving=True,
-            created_at_receiving=datetime.now(),
-            created_date_receiving=date.today(),
-        ))
-
 def db_get_item_availability(item_id: str, kitchen_id: int) -> Optional[dict]:
     """Return original weight + already-defected total + available remainder.
 
@@ -2634,36 +2615,11 @@ def db_get_item_availability(item_id: str, kitchen_id: int) -> Optional[dict]:
 
 def db_register_tray(tray_id: str, kitchen_id: Optional[int] = None) -> None:
     """Register a new tray if not exists (scoped by kitchen)."""
-    with engine.begin() as c:
-        exists = c.execute(
-            select(remote_trays.c.tray_id).where(
-                (remote_trays.c.tray_id == tray_id) &
-                (remote_trays.c.kitchen_id == kitchen_id)
-            )
-        ).first()
-        if not exists:
-            c.execute(remote_trays.insert().values(tray_id=tray_id, kitchen_id=kitchen_id))
-
-def db_enqueue_print(tspl: str, kitchen_id: Optional[int] = None) -> int:
-    with engine.begin() as c:
-        res = c.execute(remote_print_jobs.insert().values(tspl=tspl, kitchen_id=kitchen_id))
-        pk = res.inserted_primary_key
-        return int(pk[0]) if pk and pk[0] is not None else -1
-
-def db_fetch_next_print_job(kitchen_id: Optional[int] = None) -> Optional[dict]:
-    with engine.connect() as c:
-        q = select(remote_print_jobs).where(remote_print_jobs.c.printed == 0)
-        if kitchen_id is not None:
-            q = q.where(remote_print_jobs.c.kitchen_id == kitchen_id)
-        row = c.execute(q.order_by(remote_print_jobs.c.id.asc()).limit(1)).first()
-        return dict(row._mapping) if row else None
-
-def db_mark_printed(job_id: int) -> None:
     with engine.begin() as c:
         c.execute(
-            remote_print_jobs.update()
-            .where(remote_print_jobs.c.id == job_id)
-            .values(printed=1, printed_at=func.now())
+            upsert_insert(c, remote_trays)
+            .values(tray_id=tray_id, kitchen_id=kitchen_id)
+            .on_conflict_do_nothing(index_elements=["tray_id", "kitchen_id"])
         )
 
 # ---------- Food prices ----------
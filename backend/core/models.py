@@ -1,8 +1,12 @@
+from typing import List, Optional
+
 from pydantic import BaseModel
 from datetime import datetime
 
 class PrintCompletePayload(BaseModel):
-    id: int
+    # Single-job ack (legacy agents) or a batch ack from a drained poll.
+    id: Optional[int] = None
+    ids: List[int] = []
 
 
 class FoodTray:
@@ -10,6 +10,9 @@ backend as that user and verifies:
   5. `/admin/*` endpoints return 403 for a non-superadmin.
   6. A superadmin token *can* see both kitchens.
   7. Scanner key for the test kitchen writes scan errors scoped to that kitchen only.
+  8. `/api/scans/batch`: a second kitchen's scanner key cannot touch the test
+     kitchen's items, results come back in request order with INVALID_STEP
+     rows reported, and a scan that raises rolls the whole batch back.
 
 Cleans up all test data at the end.
 """
@@ -23,7 +26,9 @@ from sqlalchemy import select, text
 
 from backend.core.database import (
     engine,
+    remote_items,
     remote_kitchens,
+    remote_scan_errors,
     remote_users,
     remote_user_kitchens,
 )
@@ -106,6 +111,7 @@ def setup_test_data() -> dict:
 
     return {
         "kitchen_id": kitchen_id,
+        "other_kitchen_id": None,
         "scanner_key": scanner_key,
         "user_id": user_id,
         "super_id": super_id,
@@ -116,12 +122,14 @@ def setup_test_data() -> dict:
 
 def teardown(ctx: dict):
     with engine.begin() as c:
-        c.execute(text("DELETE FROM scan_errors WHERE kitchen_id = :k"), {"k": ctx["kitchen_id"]})
+        kids = {"k": ctx["kitchen_id"], "o": ctx["other_kitchen_id"] or ctx["kitchen_id"]}
+        c.execute(text("DELETE FROM scan_errors WHERE kitchen_id IN (:k, :o)"), kids)
+        c.execute(text("DELETE FROM items WHERE kitchen_id IN (:k, :o)"), kids)
         c.execute(text("DELETE FROM user_kitchens WHERE user_id IN (:u, :s)"),
                   {"u": ctx["user_id"], "s": ctx["super_id"]})
         c.execute(text("DELETE FROM users WHERE id IN (:u, :s)"),
                   {"u": ctx["user_id"], "s": ctx["super_id"]})
-        c.execute(text("DELETE FROM kitchens WHERE id = :k"), {"k": ctx["kitchen_id"]})
+        c.execute(text("DELETE FROM kitchens WHERE id IN (:k, :o)"), kids)
     print(f"{INFO} cleanup complete")
 
 
@@ -229,6 +237,126 @@ def run_tests(ctx: dict) -> int:
     )
     fails += not check("bogus scanner key rejected (403)", r.status_code == 403, f"got {r.status_code}")
 
+    fails += run_batch_tests(ctx)
+    return fails
+
+
+def _item_processed(item_id: str) -> bool:
+    with engine.connect() as c:
+        return bool(c.execute(
+            select(remote_items.c.processing).where(remote_items.c.id == item_id)
+        ).scalar())
+
+
+def run_batch_tests(ctx: dict) -> int:
+    """8. /api/scans/batch (scanner offline-queue replay)."""
+    fails = 0
+    # Created only now so checks 2-6 still see an empty test kitchen and only
+    # the real kitchens next to it: a 2nd kitchen whose scanner key is used
+    # against the test kitchen, and two received ingredients (one applied over
+    # HTTP, one only inside the rolled-back batch).
+    item_id, rollback_item_id = ("BHN-" + secrets.token_hex(4).upper() for _ in range(2))
+    with engine.begin() as c:
+        other = c.execute(
+            remote_kitchens.insert().values(
+                slug="zz-test-b-" + secrets.token_hex(3),
+                name="ZZ Test Kitchen B",
+                printer_name="ZZTESTPRINTERB",
+                printer_lang="ZPL",
+                label_title="ZZ Test B",
+                scanner_key=secrets.token_urlsafe(24),
+                cloud_print_key=secrets.token_urlsafe(24),
+                active=True,
+            ).returning(remote_kitchens.c.id, remote_kitchens.c.scanner_key)
+        ).first()
+        ctx["other_kitchen_id"] = other.id
+        for iid in (item_id, rollback_item_id):
+            c.execute(
+                remote_items.insert().values(
+                    id=iid, kitchen_id=ctx["kitchen_id"], name="ZZ Test Beras",
+                    weight_grams=1000, unit="gram", receiving=True, processing=False,
+                )
+            )
+
+    r = requests.post(
+        f"{BASE}/api/scans/batch",
+        headers={"X-Scanner-Key": "bogus"},
+        json={"scans": [{"code": item_id, "step": "Processing"}]},
+        timeout=60,
+    )
+    fails += not check("batch: bogus scanner key rejected (403)", r.status_code == 403, f"got {r.status_code}")
+
+    # 2nd kitchen's key: the scan is resolved in its own kitchen, so the test
+    # kitchen's item is not found there and stays unprocessed.
+    r = requests.post(
+        f"{BASE}/api/scans/batch",
+        headers={"X-Scanner-Key": other.scanner_key},
+        json={"scans": [{"code": item_id, "step": "Processing"}]},
+        timeout=60,
+    )
+    res = r.json().get("results", []) if r.status_code == 200 else []
+    fails += not check("batch: other kitchen key 200", r.status_code == 200, f"got {r.status_code}")
+    fails += not check("batch: other kitchen key routed to its own kitchen",
+                       [x.get("kitchen_id") for x in res] == [other.id], f"got {res}")
+    fails += not check("batch: other kitchen cannot process test kitchen item",
+                       [x.get("reason") for x in res] == ["INGREDIENT_NOT_FOUND"], f"got {res}")
+    fails += not check("batch: test kitchen item still unprocessed", not _item_processed(item_id))
+
+    # Own key: one result per scan, in request order, INVALID_STEP reported inline
+    scans = [
+        {"code": item_id, "step": "Processing"},
+        {"code": "TRY-ZZBATCHSTEP", "step": "Receiving"},
+        {"code": "TRY-ZZTESTFAKE", "step": "Packing"},
+        {"code": item_id, "step": "Processing"},
+    ]
+    r = requests.post(
+        f"{BASE}/api/scans/batch",
+        headers={"X-Scanner-Key": ctx["scanner_key"]},
+        json={"scans": scans},
+        timeout=60,
+    )
+    res = r.json().get("results", []) if r.status_code == 200 else []
+    fails += not check("batch: own key 200", r.status_code == 200, f"got {r.status_code} body={r.text[:120]}")
+    fails += not check("batch: results in request order",
+                       [(x.get("code"), x.get("step")) for x in res] == [(s["code"], s["step"]) for s in scans],
+                       f"got {[(x.get('code'), x.get('step')) for x in res]}")
+    got = [(x.get("ok"), x.get("reason")) for x in res]
+    fails += not check("batch: Processing applied", got[:1] == [(True, "")], f"got {got}")
+    fails += not check("batch: INVALID_STEP reported", got[1:2] == [(False, "INVALID_STEP")], f"got {got}")
+    fails += not check("batch: unregistered tray rejected", len(got) > 2 and got[2][0] is False and bool(got[2][1]), f"got {got}")
+    fails += not check("batch: later scan sees the earlier one", got[3:] == [(False, "ALREADY_PROCESSED")], f"got {got}")
+    fails += not check("batch: results scoped to test kitchen",
+                       {x.get("kitchen_id") for x in res} == {ctx["kitchen_id"]}, f"got {res}")
+    fails += not check("batch: item processed", _item_processed(item_id))
+
+    # Rollback: run the batch helper in-process with Delivery made to raise.
+    # The Processing write and the Packing scan error before it must be undone.
+    from backend.api import scans as scans_api
+
+    def _boom(c, code, kitchen_id):
+        raise RuntimeError("injected batch failure")
+
+    original = scans_api.VALIDATORS["Delivery"]
+    scans_api.VALIDATORS["Delivery"] = _boom
+    raised = False
+    try:
+        scans_api._run_scans([
+            ("Processing", rollback_item_id, rollback_item_id),
+            ("Packing", "TRY-ZZROLLBACK", "TRY-ZZROLLBACK"),
+            ("Delivery", "TRY-ZZROLLBACK", "TRY-ZZROLLBACK"),
+        ], ctx["kitchen_id"])
+    except RuntimeError:
+        raised = True
+    finally:
+        scans_api.VALIDATORS["Delivery"] = original
+    with engine.connect() as c:
+        logged = c.execute(
+            select(remote_scan_errors.c.id).where(remote_scan_errors.c.code == "TRY-ZZROLLBACK")
+        ).first()
+    fails += not check("batch: failing scan raises", raised)
+    fails += not check("batch: earlier write rolled back", not _item_processed(rollback_item_id))
+    fails += not check("batch: earlier scan error rolled back", logged is None)
+
     return fails
 
 
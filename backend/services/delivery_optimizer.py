@@ -1,15 +1,14 @@
 # DPMBG_Project\backend\services\delivery_optimizer.py
-import json
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List
 from sqlalchemy.orm import Session
 from backend.core.models import FoodTray, School
-from backend.core.database import engine
-from sqlalchemy import text
+from backend.core.database import engine, remote_trays
+from backend.utils.schools_json import load_schools_json
+from sqlalchemy import select
 
 def load_schools_from_json(file_path: str) -> List[School]:
-    with open(file_path, 'r') as f:
-        schools_data = json.load(f)
+    schools_data = load_schools_json(file_path)
 
     return [
         School(
@@ -24,50 +23,11 @@ def load_schools_from_json(file_path: str) -> List[School]:
 def fetch_trays_packed_times(db_session: Session, target_date=None) -> List[FoodTray]:
     if target_date is None:
         target_date = datetime.now().date()
+    # Bind a real date and let the DateTime column type hand back datetimes,
+    # so neither side round-trips through strings.
     rows = db_session.execute(
-        text("""
-            SELECT tray_id, created_at_packing
-            FROM trays
-            WHERE created_date_packing = :today
-            ORDER BY created_at_packing ASC
-        """),
-        {"today": str(target_date)}
-    ).fetchall()
-
-    food_trays: List[FoodTray] = []
-    for tray_id, created_at_val in rows:
-        if isinstance(created_at_val, str):
-            prepared_time = datetime.fromisoformat(created_at_val)
-        else:
-            prepared_time = created_at_val
-        food_trays.append(FoodTray(tray_id=tray_id, prepared_time=prepared_time))
-
-    return food_trays
-
-# Global variable to track the last reset date (you can also store this in the database for persistence)
-last_reset_date = None
-
-# Assign trays to schools function
-def assign_trays_to_schools(food_trays: List[FoodTray], schools: List[School], db_session: Session) -> Dict[int, Dict[str, Any]]:
-    # # Reset assignments if it's a new day
-    # reset_assignments_if_new_day()
-
-    # Ensure trays are in prepared order (earliest packed first)
-    food_trays = sorted(food_trays, key=lambda t: t.prepared_time)
-
-    # Nearest schools first
-    sorted_schools = sorted(schools, key=lambda s: s.distance)
-
-    assignments: Dict[int, Dict[str, Any]] = {}
-
-    for tray in food_trays:
-        for school in sorted_schools:
-            if school.assign_tray(tray):  # Check if the school can accept the tray
-                assignments.setdefault(school.school_id, {
-                    "school_name": school.name,
-                    "student_count": school.student_count,
-                    "assigned_trays": []
-                })["assigned_trays"].append(tray.tray_id)
-                break
-
-    return assignments
+        select(remote_trays.c.tray_id, remote_trays.c.created_at_packing)
+        .where(remote_trays.c.created_date_packing == target_date)
+        .order_by(remote_trays.c.created_at_packing.asc())
+    ).all()
+    return [FoodTray(tray_id=tray_id, prepared_time=packed_at) for tray_id, packed_at in rows]
@@ -137,6 +137,18 @@ def run_price_scrape(batch_size: int = 50, max_items: int = 0) -> dict:
     return {"total": total, "scraped": scraped, "failed": failed, "at": datetime.now().isoformat()}
 
 
+def run_print_job_purge() -> int:
+    """Drop old printed rows so print_jobs stays the size of the live queue."""
+    from backend.services.printing import db_purge_printed_jobs
+    try:
+        deleted = db_purge_printed_jobs()
+    except Exception as e:
+        logger.warning("Print job purge failed: %s", e)
+        return 0
+    logger.info("Print job purge: %d printed jobs deleted", deleted)
+    return deleted
+
+
 # ── Scheduler setup ───────────────────────────────────────────────────────────
 
 def start_scheduler():
@@ -165,6 +177,14 @@ def start_scheduler():
         kwargs={"batch_size": 50},
     )
 
+    sched.add_job(
+        run_print_job_purge,
+        trigger=CronTrigger(hour=3, minute=0, timezone="Asia/Jakarta"),
+        id="daily_print_job_purge",
+        replace_existing=True,
+        misfire_grace_time=3600,
+    )
+
     sched.start()
     logger.info("Price scrape scheduler started — daily at 02:00 WIB")
     return sched
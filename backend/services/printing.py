@@ -1,12 +1,15 @@
 # backend/services/printing.py
 
 import os
+import asyncio
 import logging
 import threading
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import List, Optional
 
-from sqlalchemy import select, func
+from sqlalchemy import bindparam, select, func
 from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
 
 from backend.core.database import engine, remote_print_jobs
 
@@ -17,6 +20,8 @@ logger = logging.getLogger(__name__)
 # When the backend runs on the same box as the printer we skip the WS detour.
 LOCAL_PRINT = os.getenv("LOCAL_PRINT", "").lower() in ("1", "true", "yes")
 PRINTER_NAME_FALLBACK = os.getenv("PRINTER_NAME", "")
+# Legacy single-kitchen label dialect, read once rather than on every label.
+PRINTER_LANG_FALLBACK = os.getenv("PRINTER_LANG", "TSPL").upper()
 
 try:
     import win32print
@@ -27,30 +32,113 @@ except ImportError:
 
 # ---------- DB helpers ----------
 
+_INSERT_JOB = remote_print_jobs.insert().returning(remote_print_jobs.c.id)
+
+
 def db_create_print_job(tspl: str, kitchen_id: Optional[int] = None) -> int:
     with engine.begin() as c:
-        res = c.execute(
-            remote_print_jobs.insert().values(tspl=tspl, printed=0, kitchen_id=kitchen_id)
-        )
-        return res.inserted_primary_key[0]
+        return c.execute(_INSERT_JOB, {"tspl": tspl, "printed": 0, "kitchen_id": kitchen_id}).scalar_one()
+
 
+# Postgres channel the /print-queue workers LISTEN on (see print_queue); the
+# payload is the kitchen id, or "" for an unscoped job.
+PRINT_JOBS_CHANNEL = "print_jobs"
+_NOTIFY_JOB = select(func.pg_notify(PRINT_JOBS_CHANNEL, bindparam("kid")))
+
+
+def db_notify_print_job(kitchen_id: Optional[int]) -> None:
+    """Tell the other worker processes a job is waiting. No-op off Postgres."""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as c:
+        c.execute(_NOTIFY_JOB, {"kid": "" if kitchen_id is None else str(kitchen_id)})
 
-def db_get_next_print_job(kitchen_id: Optional[int] = None) -> Optional[dict]:
-    with engine.connect() as c:
-        q = select(remote_print_jobs).where(remote_print_jobs.c.printed == 0)
-        if kitchen_id is not None:
-            q = q.where(remote_print_jobs.c.kitchen_id == kitchen_id)
-        row = c.execute(q.order_by(remote_print_jobs.c.id.asc()).limit(1)).first()
-        return dict(row._mapping) if row else None
+
+# How long a polled-but-unacked job stays hidden from other pollers. If the
+# agent dies or the printer errors before /print-complete, the job comes back.
+PRINT_CLAIM_LEASE = timedelta(seconds=60)
+
+# Printed jobs are only kept for reprint/debugging; the nightly purge in
+# price_scheduler drops anything older than this.
+PRINT_JOB_RETENTION_DAYS = int(os.getenv("PRINT_JOB_RETENTION_DAYS", "7"))
+
+
+def _claim_query(scoped: bool):
+    """UPDATE ... RETURNING that claims the oldest claimable jobs, built once
+    per variant (all jobs, or one kitchen's) with binds now/cutoff/lim[/kid]."""
+    t = remote_print_jobs.c
+    claimable = (t.printed == 0) & (t.claimed_at.is_(None) | (t.claimed_at < bindparam("cutoff")))
+    pending = select(t.id).where(claimable)
+    if scoped:
+        pending = pending.where(t.kitchen_id == bindparam("kid"))
+    # SKIP LOCKED: a concurrent claimer passes over rows another poller is
+    # claiming and takes the next ones, instead of queueing behind its lock
+    # and then finding them claimed.
+    pending = pending.order_by(t.id.asc()).limit(bindparam("lim")).with_for_update(skip_locked=True)
+    return (
+        remote_print_jobs.update()
+        .where(t.id.in_(pending.scalar_subquery()) & claimable)
+        .values(claimed_at=bindparam("now"))
+        .returning(t.id, t.tspl)
+    )
+
+
+_CLAIM_JOBS = _claim_query(scoped=False)
+_CLAIM_KITCHEN_JOBS = _claim_query(scoped=True)
+
+
+def db_claim_print_jobs(kitchen_id: Optional[int] = None, limit: int = 1) -> List[dict]:
+    """Claim up to `limit` oldest unprinted jobs in one UPDATE ... RETURNING.
+
+    Two pollers can no longer receive the same job: the pending rows are
+    picked FOR UPDATE SKIP LOCKED, and the claim predicate is repeated on the
+    outer UPDATE as well. Jobs stay `printed = 0` until acked."""
+    now = datetime.now()
+    params = {"now": now, "cutoff": now - PRINT_CLAIM_LEASE, "lim": limit}
+    q = _CLAIM_JOBS
+    if kitchen_id is not None:
+        q = _CLAIM_KITCHEN_JOBS
+        params["kid"] = kitchen_id
+    with engine.begin() as c:
+        rows = c.execute(q, params).fetchall()
+    # RETURNING order is unspecified; agents print in id order.
+    return sorted((dict(r._mapping) for r in rows), key=lambda j: j["id"])
+
+
+_MARK_PRINTED = (
+    remote_print_jobs.update()
+    .where(remote_print_jobs.c.id.in_(bindparam("ids", expanding=True)))
+    .values(printed=1, printed_at=func.now())
+)
+_MARK_KITCHEN_PRINTED = _MARK_PRINTED.where(remote_print_jobs.c.kitchen_id == bindparam("kid"))
 
 
 def db_mark_print_job_printed(job_id: int):
+    db_mark_print_jobs_printed([job_id])
+
+
+def db_mark_print_jobs_printed(job_ids: List[int], kitchen_id: Optional[int] = None) -> int:
+    """Mark several jobs printed in one UPDATE. When `kitchen_id` is given, ids
+    belonging to other kitchens are ignored. Returns the number of rows updated."""
+    if not job_ids:
+        return 0
+    if kitchen_id is None:
+        q, params = _MARK_PRINTED, {"ids": list(job_ids)}
+    else:
+        q, params = _MARK_KITCHEN_PRINTED, {"ids": list(job_ids), "kid": kitchen_id}
+    with engine.begin() as c:
+        return c.execute(q, params).rowcount
+
+
+def db_purge_printed_jobs(older_than_days: int = PRINT_JOB_RETENTION_DAYS) -> int:
+    """Delete jobs printed more than `older_than_days` ago. Unprinted jobs are
+    never touched. Returns the number of rows deleted."""
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    q = remote_print_jobs.delete().where(
+        (remote_print_jobs.c.printed == 1) & (remote_print_jobs.c.printed_at < cutoff)
+    )
     with engine.begin() as c:
-        c.execute(
-            remote_print_jobs.update()
-            .where(remote_print_jobs.c.id == job_id)
-            .values(printed=1, printed_at=func.now())
-        )
+        return c.execute(q).rowcount
 
 
 def _send_raw_to_printer(data: str, printer_name: Optional[str] = None):
@@ -94,23 +182,73 @@ async def create_and_push_job(tspl: str, kitchen_id: Optional[int] = None,
     """
     if LOCAL_PRINT and HAS_WIN32:
         try:
-            _send_raw_to_printer(tspl, printer_name=printer_name)
+            await run_in_threadpool(_send_raw_to_printer, tspl, printer_name=printer_name)
         except Exception as e:
             logger.error(f"[PRINT] Direct print failed: {e}")
         threading.Thread(target=_sync_to_db, args=(tspl, kitchen_id), daemon=True).start()
         return -1
 
-    from backend.api.print_queue import push_job_to_agent
+    from backend.api.print_queue import push_job_to_agent, notify_job_queued
 
-    job_id = db_create_print_job(tspl, kitchen_id=kitchen_id)
+    job_id = await run_in_threadpool(db_create_print_job, tspl, kitchen_id=kitchen_id)
     pushed = await push_job_to_agent(job_id, tspl, kitchen_id=kitchen_id)
     if pushed:
         logger.info(f"[PRINT] Job {job_id} pushed via WebSocket to kitchen={kitchen_id}")
     else:
+        notify_job_queued(kitchen_id)
+        try:
+            await run_in_threadpool(db_notify_print_job, kitchen_id)
+        except Exception as e:
+            logger.warning(f"[PRINT] NOTIFY for job {job_id} failed: {e}")
         logger.info(f"[PRINT] Job {job_id} queued for polling (kitchen={kitchen_id}, agent offline)")
     return job_id
 
 
+# create_and_push_job_later runs jobs one at a time, in call order, from one
+# worker task per process, so a batch's Delivery labels are queued in scan
+# order. drain_print_queue() at shutdown lets the backlog finish.
+_print_queue: Optional[asyncio.Queue] = None
+_print_worker: Optional[asyncio.Task] = None
+
+
+async def _run_print_queue(queue: asyncio.Queue):
+    while True:
+        tspl, kitchen_id, printer_name = await queue.get()
+        try:
+            await create_and_push_job(tspl, kitchen_id=kitchen_id, printer_name=printer_name)
+        except Exception as e:
+            logger.error(f"[PRINT] Background print failed (kitchen={kitchen_id}): {e}")
+        finally:
+            queue.task_done()
+
+
+def create_and_push_job_later(tspl: str, kitchen_id: Optional[int] = None,
+                              printer_name: Optional[str] = None) -> None:
+    """Queue create_and_push_job for responses that don't depend on the print.
+    Once the job row is written an offline agent still gets it by polling.
+    Must be called from the event loop."""
+    global _print_queue, _print_worker
+    loop = asyncio.get_running_loop()
+    if _print_worker is None or _print_worker.done() or _print_worker.get_loop() is not loop:
+        _print_queue = asyncio.Queue()
+        _print_worker = loop.create_task(_run_print_queue(_print_queue))
+    _print_queue.put_nowait((tspl, kitchen_id, printer_name))
+
+
+async def drain_print_queue(timeout: float = 10.0) -> None:
+    """Wait up to `timeout` seconds for queued background prints, then stop
+    the worker. Called from the app's shutdown."""
+    global _print_worker
+    if _print_worker is None:
+        return
+    try:
+        await asyncio.wait_for(_print_queue.join(), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"[PRINT] {_print_queue.qsize()} background print(s) dropped at shutdown")
+    _print_worker.cancel()
+    _print_worker = None
+
+
 # ---------- Label generation ----------
 
 def generate_tspl(item_id, name, weight_g):
@@ -135,15 +273,12 @@ def generate_zpl(item_id, name, weight_g):
     )
 
 
+_LABEL_GENERATORS = {"ZPL": generate_zpl, "TSPL": generate_tspl}
+
+
 def generate_label(item_id, name, weight_g, kitchen: Optional[dict] = None):
     """Pick the label dialect based on the kitchen's printer_lang column,
     falling back to PRINTER_LANG env for the legacy single-kitchen setup."""
-    lang = None
-    if kitchen:
-        lang = (kitchen.get("printer_lang") or "").upper() or None
-    if not lang:
-        lang = os.getenv("PRINTER_LANG", "TSPL").upper()
-
-    if lang == "ZPL":
-        return generate_zpl(item_id, name, weight_g)
-    return generate_tspl(item_id, name, weight_g)
+    lang = (kitchen.get("printer_lang") or "").upper() if kitchen else ""
+    generator = _LABEL_GENERATORS.get(lang or PRINTER_LANG_FALLBACK, generate_tspl)
+    return generator(item_id, name, weight_g)
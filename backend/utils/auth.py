@@ -1,11 +1,14 @@
 import os
+import time
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Optional
 
 import bcrypt
 from fastapi import Depends, HTTPException, Header, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from jose.exceptions import ExpiredSignatureError
 from sqlalchemy import select
 
 from backend.core.database import (
@@ -42,10 +45,23 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def decode_access_token(token: str) -> dict:
+# Every authenticated request re-sends the same token for up to a week. Only
+# tokens that verified are cached (an exception is never memoised); expiry is
+# re-checked on each hit since jwt.decode only checked it the first time.
+@lru_cache(maxsize=1024)
+def _verified_claims(token: str) -> dict:
     return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
 
 
+def decode_access_token(token: str) -> dict:
+    """Claims of a valid token. Shared between calls — treat as read-only."""
+    payload = _verified_claims(token)
+    exp = payload.get("exp")
+    if exp is not None and exp <= time.time():
+        raise ExpiredSignatureError("Signature has expired.")
+    return payload
+
+
 # ── DB lookups ──────────────────────────────────────────────────────────────
 
 def authenticate_user(username: str, password: str, org_slug: Optional[str] = None) -> Optional[dict]:
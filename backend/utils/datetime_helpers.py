@@ -1,4 +1,4 @@
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timedelta
 from typing import Optional, Tuple
 from backend.core.config import TZ_REGION
 
@@ -10,10 +10,24 @@ except Exception:
     ZoneInfo = None
 
 
+def _load_local_tz():
+    if ZoneInfo:
+        try:
+            return ZoneInfo(TZ_REGION)
+        except Exception:
+            pass
+    return datetime.now().astimezone().tzinfo
+
+
+# Resolved once; TZ_REGION is fixed for the life of the process.
+LOCAL_TZ = _load_local_tz()
+
+
+def now_local() -> datetime:
+    return datetime.now(tz=LOCAL_TZ)
+
 def now_local_iso() -> str:
-    dt_utc = datetime.now(tz=timezone.utc)
-    tz = ZoneInfo(TZ_REGION) if ZoneInfo else datetime.now().astimezone().tzinfo
-    return dt_utc.astimezone(tz).isoformat(timespec="seconds")
+    return now_local().isoformat(timespec="seconds")
 
 def parse_duration_hms(td: timedelta) -> Tuple[str, int]:
     sec = max(0, int(td.total_seconds()))
@@ -0,0 +1,31 @@
+import json
+import os
+
+# Legacy school list. The schools table replaced it in Phase 1, but it is still
+# the fallback for kitchens with no school master data.
+SCHOOLS_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "data", "schools.json",
+)
+
+# path -> (st_mtime_ns, parsed list)
+_cache: dict[str, tuple[int, list]] = {}
+
+
+def load_schools_json(path: str = SCHOOLS_FILE) -> list[dict]:
+    """Parsed schools.json, re-read only when the file's mtime changes.
+
+    Returns [] when the file is missing. The list is shared between callers —
+    treat it as read-only.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return []
+    hit = _cache.get(path)
+    if hit and hit[0] == mtime:
+        return hit[1]
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    _cache[path] = (mtime, data)
+    return data
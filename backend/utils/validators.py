@@ -1,15 +1,18 @@
-import re, uuid
+import re, secrets
 from typing import Optional
 from backend.core.config import DIV_CANON
 
+_WORD_RE = re.compile(r"[a-zA-Z_]+")
+
 def canonical_division(text: str) -> Optional[str]:
     if not text:
         return None
     t = text.strip().lower()
-    parts = re.findall(r"[a-zA-Z_]+", t)
-    for p in parts:
-        if p in DIV_CANON:
-            return DIV_CANON[p]
+    # First known word wins; finditer stops there instead of listing them all.
+    for m in _WORD_RE.finditer(t):
+        canon = DIV_CANON.get(m.group())
+        if canon:
+            return canon
     return DIV_CANON.get(t)
 
 def is_item_id(s: str) -> bool:
@@ -18,8 +21,10 @@ def is_item_id(s: str) -> bool:
 def is_tray_id(s: str) -> bool:
     return s.upper().startswith("TRY-")
 
+# 4 random bytes -> 8 hex chars: the same BHN-XXXXXXXX space as before,
+# without building a 16-byte UUID only to keep half of its hex.
 def new_item_id() -> str:
-    return "BHN-" + uuid.uuid4().hex[:8].upper()
+    return "BHN-" + secrets.token_hex(4).upper()
 
 def new_defect_id() -> str:
-    return "DEF-" + uuid.uuid4().hex[:8].upper()
+    return "DEF-" + secrets.token_hex(4).upper()
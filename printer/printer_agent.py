@@ -9,14 +9,20 @@ Run:  python printer_agent.py   (from project root)
 
 import os
 import time
+import atexit
 import logging
 import threading
 import json
+from collections import OrderedDict
 
 import requests
 from dotenv import load_dotenv
 
-_ws_printed_jobs: set = set()
+# Job ids already printed via WS, so the polling fallback doesn't print them
+# twice. Bounded LRU: WS-acked jobs are marked printed server-side and normally
+# never come back through polling, so an unbounded set would only ever grow.
+_WS_PRINTED_MAX = 1000
+_ws_printed_jobs: "OrderedDict[int, None]" = OrderedDict()
 _ws_printed_lock = threading.Lock()
 
 load_dotenv()
@@ -32,6 +38,16 @@ CLOUD_PRINT_KEY = os.getenv("CLOUD_PRINT_KEY", "")
 PRINTER_NAME    = os.getenv("PRINTER_NAME", "")
 POLL_INTERVAL   = float(os.getenv("POLL_INTERVAL", "3.0"))
 HTTP_TIMEOUT    = 35
+# Server holds an empty /print-queue poll open this long (must stay < HTTP_TIMEOUT)
+LONG_POLL_WAIT  = float(os.getenv("LONG_POLL_WAIT", "25"))
+# Jobs claimed per /print-queue poll (server default 1 for older agents, max 50)
+POLL_BATCH      = 10
+
+# Keep-alive session: the long-poll loop and its acks reuse one connection
+# instead of a new TCP/TLS handshake per request.
+_http = requests.Session()
+if CLOUD_PRINT_KEY:
+    _http.headers["X-Print-Key"] = CLOUD_PRINT_KEY
 
 try:
     import win32print
@@ -50,23 +66,59 @@ except ImportError:
 
 # ---------- Print ----------
 
+# The PRINTER_NAME handle stays open between jobs: OpenPrinter/ClosePrinter
+# are a spooler round-trip each. StartDoc/EndDoc still delimit every job.
+# The lock is needed because the WS and polling threads both print.
+_printer = None
+_printer_lock = threading.Lock()
+
+
+def _close_printer():
+    global _printer
+    if _printer is not None:
+        try:
+            win32print.ClosePrinter(_printer)
+        except Exception:
+            pass
+        _printer = None
+
+
+def _start_doc():
+    """StartDocPrinter on the cached handle. A stale handle (printer
+    power-cycled, spooler restarted) is reopened once; nothing has been sent
+    at this point, so retrying cannot print twice."""
+    global _printer
+    for attempt in (0, 1):
+        if _printer is None:
+            _printer = win32print.OpenPrinter(PRINTER_NAME)
+        try:
+            win32print.StartDocPrinter(_printer, 1, ("RAW JOB", None, "RAW"))
+            return _printer
+        except Exception:
+            _close_printer()
+            if attempt:
+                raise
+
+
+atexit.register(_close_printer)
+
+
 def send_raw_to_printer(data: str):
     if not HAS_WIN32:
         raise RuntimeError("win32print not available")
     if not data.endswith("\n"):
         data += "\n"
-    hPrinter = None
-    try:
-        hPrinter = win32print.OpenPrinter(PRINTER_NAME)
-        job = win32print.StartDocPrinter(hPrinter, 1, ("RAW JOB", None, "RAW"))
-        win32print.StartPagePrinter(hPrinter)
-        win32print.WritePrinter(hPrinter, data.encode("utf-8"))
-        win32print.EndPagePrinter(hPrinter)
-        win32print.EndDocPrinter(hPrinter)
-        logger.info(f"[PRINT] Sent to '{PRINTER_NAME}'")
-    finally:
-        if hPrinter:
-            win32print.ClosePrinter(hPrinter)
+    with _printer_lock:
+        hPrinter = _start_doc()
+        try:
+            win32print.StartPagePrinter(hPrinter)
+            win32print.WritePrinter(hPrinter, data.encode("utf-8"))
+            win32print.EndPagePrinter(hPrinter)
+            win32print.EndDocPrinter(hPrinter)
+        except Exception:
+            _close_printer()
+            raise
+    logger.info(f"[PRINT] Sent to '{PRINTER_NAME}'")
 
 
 # ---------- WebSocket mode ----------
@@ -84,7 +136,10 @@ def on_ws_message(ws, message):
         logger.info(f"[WS] Received job id={job_id}")
         send_raw_to_printer(tspl)
         with _ws_printed_lock:
-            _ws_printed_jobs.add(job_id)
+            _ws_printed_jobs[job_id] = None
+            _ws_printed_jobs.move_to_end(job_id)
+            while len(_ws_printed_jobs) > _WS_PRINTED_MAX:
+                _ws_printed_jobs.popitem(last=False)
         ws.send(json.dumps({"id": job_id, "ok": True}))
         logger.info(f"[WS] Ack sent for job {job_id}")
     except Exception as e:
@@ -125,43 +180,40 @@ def run_ws():
 # ---------- HTTP polling fallback ----------
 
 def poll_once():
-    headers = {}
-    if CLOUD_PRINT_KEY:
-        headers["X-Print-Key"] = CLOUD_PRINT_KEY
-    resp = requests.get(
+    resp = _http.get(
         f"{API_BASE_URL}/print-queue",
-        headers=headers,
+        params={"limit": POLL_BATCH, "wait": LONG_POLL_WAIT},
         timeout=HTTP_TIMEOUT,
     )
     resp.raise_for_status()
     jobs = resp.json().get("jobs", [])
     if not jobs:
         return
-    job = jobs[0]
-    job_id, tspl = job["id"], job["tspl"]
-    with _ws_printed_lock:
-        already_printed = job_id in _ws_printed_jobs
-        if already_printed:
-            _ws_printed_jobs.discard(job_id)
-    if already_printed:
-        logger.info(f"[POLL] Skipping job {job_id} — already sent via WS")
-        # Still mark as printed in DB so it doesn't stay in queue
-        requests.post(
-            f"{API_BASE_URL}/print-complete",
-            json={"id": job_id},
-            headers=headers,
-            timeout=HTTP_TIMEOUT,
-        ).raise_for_status()
-        return
-    logger.info(f"[POLL] Received job id={job_id}")
-    send_raw_to_printer(tspl)
-    requests.post(
-        f"{API_BASE_URL}/print-complete",
-        json={"id": job_id},
-        headers=headers,
-        timeout=HTTP_TIMEOUT,
-    ).raise_for_status()
-    logger.info(f"[POLL] Job {job_id} done")
+    # Ack everything handled in this batch with one POST, even if a later job
+    # fails to print — otherwise the already-printed ones would come back.
+    done = []
+    try:
+        for job in jobs:
+            job_id, tspl = job["id"], job["tspl"]
+            with _ws_printed_lock:
+                already_printed = job_id in _ws_printed_jobs
+                if already_printed:
+                    del _ws_printed_jobs[job_id]
+            if already_printed:
+                # Still mark as printed in DB so it doesn't stay in queue
+                logger.info(f"[POLL] Skipping job {job_id} — already sent via WS")
+            else:
+                logger.info(f"[POLL] Received job id={job_id}")
+                send_raw_to_printer(tspl)
+            done.append(job_id)
+    finally:
+        if done:
+            _http.post(
+                f"{API_BASE_URL}/print-complete",
+                json={"ids": done},
+                timeout=HTTP_TIMEOUT,
+            ).raise_for_status()
+            logger.info(f"[POLL] Jobs {done} done")
 
 
 def run_polling():
@@ -185,11 +237,9 @@ def _register_printers():
         printers = [p[2] for p in win32print.EnumPrinters(
             win32print.PRINTER_ENUM_LOCAL | win32print.PRINTER_ENUM_CONNECTIONS
         )]
-        headers = {"X-Print-Key": CLOUD_PRINT_KEY} if CLOUD_PRINT_KEY else {}
-        requests.post(
+        _http.post(
             f"{API_BASE_URL}/api/printer/register",
             json={"printers": printers},
-            headers=headers,
             timeout=HTTP_TIMEOUT,
         )
         logger.info(f"Registered {len(printers)} printer(s): {printers}")
@@ -38,6 +38,10 @@ PRINTER_NAME    = os.getenv("PRINTER_NAME", "DPMBGPasehZP550")
 POLL_INTERVAL   = float(os.getenv("POLL_INTERVAL", "2.0"))
 PRINTER_LANG    = os.getenv("PRINTER_LANG", "TSPL").upper()
 HTTP_TIMEOUT    = 35
+# Server holds an empty /print-queue poll open this long (must stay < HTTP_TIMEOUT)
+LONG_POLL_WAIT  = float(os.getenv("LONG_POLL_WAIT", "25"))
+# Jobs claimed per /print-queue poll (server default 1 for older agents, max 50)
+POLL_BATCH      = 10
 
 # --- Windows printing ---
 try:
@@ -72,13 +76,14 @@ def send_raw_to_printer(data: str, printer_name: str):
 
 
 def poll_once():
-    """Fetch one print job from API and print it."""
+    """Fetch pending print jobs from API and print them."""
     headers = {}
     if CLOUD_PRINT_KEY:
         headers["X-Print-Key"] = CLOUD_PRINT_KEY
 
     resp = requests.get(
         f"{API_BASE_URL}/print-queue",
+        params={"limit": POLL_BATCH, "wait": LONG_POLL_WAIT},
         headers=headers,
         timeout=HTTP_TIMEOUT,
     )
@@ -89,25 +94,26 @@ def poll_once():
     if not jobs:
         return
 
-    job = jobs[0]
-    job_id = job["id"]
-    tspl = job["tspl"]
-
-    logger.info(f"Received print job id={job_id}")
-
-    # Print to local printer
-    send_raw_to_printer(tspl, PRINTER_NAME)
-
-    # Mark as printed via API
-    resp = requests.post(
-        f"{API_BASE_URL}/print-complete",
-        json={"id": job_id},
-        headers=headers,
-        timeout=HTTP_TIMEOUT,
-    )
-    resp.raise_for_status()
+    printed = []
+    try:
+        for job in jobs:
+            job_id = job["id"]
+            logger.info(f"Received print job id={job_id}")
 
-    logger.info(f"Marked job {job_id} as printed")
+            # Print to local printer
+            send_raw_to_printer(job["tspl"], PRINTER_NAME)
+            printed.append(job_id)
+    finally:
+        # Mark everything that made it to the printer as printed, in one call
+        if printed:
+            resp = requests.post(
+                f"{API_BASE_URL}/print-complete",
+                json={"ids": printed},
+                headers=headers,
+                timeout=HTTP_TIMEOUT,
+            )
+            resp.raise_for_status()
+            logger.info(f"Marked jobs {printed} as printed")
 
 
 def register_printers():
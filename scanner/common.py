@@ -8,6 +8,9 @@ Flow:
   1. Scan barcode from stdin (HID device)
   2. POST to FastAPI /api/scans for validation + DB write
   3. On network failure: queue locally in SQLite, retry via background thread every 30s
+     (replayed through /api/scans/batch, up to SYNC_BATCH_SIZE scans per request;
+     a page the batch endpoint rejects is replayed scan by scan through /api/scans,
+     and a scan the server keeps rejecting as invalid is parked after MAX_SYNC_ATTEMPTS)
 """
 
 import os
@@ -38,6 +41,17 @@ DEBOUNCE_SECONDS = 0.7
 ALLOWED_STEPS    = {"Processing", "Packing", "Delivery"}
 HTTP_TIMEOUT     = 5
 RETRY_INTERVAL   = 30
+SYNC_BATCH_SIZE  = 50   # scans per /api/scans/batch request (server cap: 100)
+SYNC_TIMEOUT     = 30   # a batch is applied scan by scan server-side
+MAX_SYNC_ATTEMPTS = 5   # rejected replays before a queued scan is parked
+# Only a validation rejection is the scan's fault. Anything else (5xx during a
+# DB outage, 403, ...) stops the cycle and the scan is retried as before.
+REJECTED_STATUSES = {400, 422}
+
+# One keep-alive session for the scan loop and the retry thread, so a scan
+# doesn't pay a fresh TCP/TLS handshake to the backend every time.
+_http = requests.Session()
+_http.headers["X-Scanner-Key"] = SCANNER_KEY
 
 # Local SQLite for offline queue
 LOCAL_DB_PATH = os.path.join(_here, "local_queue.db")
@@ -48,17 +62,36 @@ TRAY_PREFIX   = "TRY-"
 # LOCAL SQLITE QUEUE (offline resilience)
 # ============================================================
 
+_local_db = threading.local()
+
+
 def _get_local_db():
+    """Connection to the offline queue, opened once per thread (the scan loop
+    and the retry thread) so an enqueue is a single INSERT + commit rather than
+    connect + pragmas + CREATE TABLE + commit every time."""
+    conn = getattr(_local_db, "conn", None)
+    if conn is not None:
+        return conn
     conn = sqlite3.connect(LOCAL_DB_PATH, timeout=5)
+    # WAL + NORMAL: the scan loop's enqueue and the retry thread's deletes
+    # don't block each other, and a commit doesn't wait on a full fsync.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
     conn.execute("""
         CREATE TABLE IF NOT EXISTS pending_scans (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             code TEXT NOT NULL,
             step TEXT NOT NULL,
-            created_at TEXT NOT NULL
+            created_at TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0
         )
     """)
+    # Queue files created before the attempts column existed
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(pending_scans)")}
+    if "attempts" not in cols:
+        conn.execute("ALTER TABLE pending_scans ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
     conn.commit()
+    _local_db.conn = conn
     return conn
 
 
@@ -69,37 +102,113 @@ def local_enqueue(code: str, step: str):
         (code, step, datetime.now().isoformat()),
     )
     conn.commit()
-    conn.close()
+
+
+# Set by the scan loop when the server answers again after a NETWORK_ERROR,
+# so the backlog is replayed right away instead of at the next 30s tick.
+_retry_wakeup = threading.Event()
+
+
+def _delete_pending(conn, ids):
+    conn.execute(
+        f"DELETE FROM pending_scans WHERE id IN ({','.join('?' * len(ids))})",
+        ids,
+    )
+    conn.commit()
+
+
+def _replay_one(conn, row_id: int, code: str, step: str) -> bool:
+    """Replay one queued scan through /api/scans. Returns False unless the
+    server either took the scan or rejected it as invalid, so the caller
+    stops this cycle without counting the failure against the scan."""
+    try:
+        resp = _http.post(
+            f"{API_BASE_URL}/api/scans",
+            json={"code": code, "step": step},
+            timeout=HTTP_TIMEOUT,
+        )
+    except requests.RequestException:
+        return False
+    if resp.status_code == 200:
+        _delete_pending(conn, [row_id])
+        body = resp.json()
+        status = "OK" if body.get("ok") else body.get("reason", "")
+        sys.stdout.write(f"[SYNC] Retried {code} ({step}) -> {status}\n")
+        return True
+    if resp.status_code not in REJECTED_STATUSES:
+        return False
+
+    # The server rejected this scan as invalid; count it so a scan that can
+    # never be applied stops being replayed, but stays in the file for
+    # inspection.
+    conn.execute("UPDATE pending_scans SET attempts = attempts + 1 WHERE id = ?", (row_id,))
+    conn.commit()
+    attempts = conn.execute(
+        "SELECT attempts FROM pending_scans WHERE id = ?", (row_id,)
+    ).fetchone()[0]
+    if attempts >= MAX_SYNC_ATTEMPTS:
+        sys.stdout.write(f"[SYNC] Parked {code} ({step}) after {attempts} failed attempts (HTTP {resp.status_code})\n")
+    else:
+        sys.stdout.write(f"[SYNC] Retry {code} ({step}) failed: HTTP {resp.status_code}\n")
+    return True
 
 
 def _retry_pending():
-    """Background thread: retry pending scans every RETRY_INTERVAL seconds."""
+    """Background thread: retry pending scans every RETRY_INTERVAL seconds,
+    or as soon as the scan loop sees the network come back."""
     while True:
-        time.sleep(RETRY_INTERVAL)
+        _retry_wakeup.wait(RETRY_INTERVAL)
+        _retry_wakeup.clear()
         try:
             conn = _get_local_db()
-            rows = conn.execute("SELECT id, code, step FROM pending_scans ORDER BY id").fetchall()
-            if not rows:
-                conn.close()
-                continue
-
-            for row_id, code, step in rows:
-                try:
-                    resp = requests.post(
-                        f"{API_BASE_URL}/api/scans",
-                        json={"code": code, "step": step},
-                        headers={"X-Scanner-Key": SCANNER_KEY},
-                        timeout=HTTP_TIMEOUT,
-                    )
-                    if resp.status_code == 200:
-                        conn.execute("DELETE FROM pending_scans WHERE id = ?", (row_id,))
-                        conn.commit()
-                        sys.stdout.write(f"[SYNC] Retried {code} ({step}) -> OK\n")
-                        sys.stdout.flush()
-                except requests.RequestException:
-                    break  # Network still down, stop retrying this cycle
-
-            conn.close()
+            # Page through the queue instead of loading the whole backlog: a
+            # long outage can leave thousands of rows, and each page's ids also
+            # bound the size of the DELETE ... IN below.
+            last_id = 0
+            use_batch = True
+            while True:
+                batch = conn.execute(
+                    "SELECT id, code, step FROM pending_scans"
+                    " WHERE id > ? AND attempts < ? ORDER BY id LIMIT ?",
+                    (last_id, MAX_SYNC_ATTEMPTS, SYNC_BATCH_SIZE),
+                ).fetchall()
+                if not batch:
+                    break
+                last_id = batch[-1][0]
+
+                resp = None
+                if use_batch:
+                    try:
+                        resp = _http.post(
+                            f"{API_BASE_URL}/api/scans/batch",
+                            json={"scans": [{"code": code, "step": step} for _, code, step in batch]},
+                            timeout=SYNC_TIMEOUT,
+                        )
+                    except requests.RequestException:
+                        break  # Network still down, stop retrying this cycle
+                    if resp.status_code == 404:
+                        use_batch = False  # Backend without /api/scans/batch
+                    elif resp.status_code not in (200, *REJECTED_STATUSES):
+                        break  # Backend error or key rejected: no row is at fault
+
+                if resp is not None and resp.status_code == 200:
+                    _delete_pending(conn, [row_id for row_id, _, _ in batch])
+                    for r in resp.json().get("results", []):
+                        status = "OK" if r.get("ok") else r.get("reason", "")
+                        sys.stdout.write(f"[SYNC] Retried {r.get('code')} ({r.get('step')}) -> {status}\n")
+                    sys.stdout.flush()
+                    continue
+
+                # Batch unavailable, or rejected for one bad row (422):
+                # replay this page scan by scan so one bad row can't block the rest.
+                online = True
+                for row_id, code, step in batch:
+                    if not _replay_one(conn, row_id, code, step):
+                        online = False
+                        break
+                sys.stdout.flush()
+                if not online:
+                    break
         except Exception as e:
             sys.stdout.write(f"[SYNC] Error: {e}\n")
             sys.stdout.flush()
@@ -120,10 +229,9 @@ def post_scan(code: str, step: str) -> tuple[bool, str, dict]:
     On network failure returns (False, "NETWORK_ERROR: ...", {}).
     """
     try:
-        resp = requests.post(
+        resp = _http.post(
             f"{API_BASE_URL}/api/scans",
             json={"code": code, "step": step},
-            headers={"X-Scanner-Key": SCANNER_KEY},
             timeout=HTTP_TIMEOUT,
         )
         body = resp.json()
@@ -217,15 +325,16 @@ def run_scanner(
     start_retry_thread()
 
     last_code = None
-    last_time = 0.0
+    last_time = float("-inf")
+    offline = False
 
     for line in sys.stdin:
         raw = line.strip()
         when = now_str()
         code = extract_code(raw)
 
-        # Debounce duplicate scans
-        t = time.time()
+        # Debounce duplicate scans (monotonic: immune to NTP / manual clock jumps)
+        t = time.monotonic()
         if code and code == last_code and (t - last_time) < DEBOUNCE_SECONDS:
             continue
         last_code, last_time = code, t
@@ -241,11 +350,17 @@ def run_scanner(
             if reason.startswith("NETWORK_ERROR"):
                 # Save to local queue for retry
                 local_enqueue(code, mode)
+                offline = True
                 play_sound(failed_sound)
                 sys.stdout.write(f"OFFLINE QUEUED\n{when}\n{code} -> will retry\n\n\n")
                 sys.stdout.flush()
                 continue
 
+            if offline:
+                # Server reachable again: flush the offline queue now.
+                offline = False
+                _retry_wakeup.set()
+
             if not ok:
                 play_sound(failed_sound)
                 print_status(False, when, reason)